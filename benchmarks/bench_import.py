@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+"""
+Benchmark of application startup. Times fresh interpreters importing the app and building it with create_app,
+with the google client libraries loaded lazily (as shipped) and eagerly (imported up front the way the modules used to).
+Each run uses a throwaway home directory so nothing is read from the real ~/.gdrive.
+
+Usage: python -m benchmarks.bench_import [runs]
+"""
+
+#the google modules the app used to import at module load
+EAGER_IMPORTS = 'import googleapiclient.discovery, googleapiclient.http, google.oauth2.credentials, google_auth_oauthlib.flow, google.auth.transport.requests'
+CREATE_APP = 'from src.app import create_app; create_app()'
+
+
+def measure(code: str, runs: int, env) -> float:
+    """Best wall time of a fresh interpreter running code, in milliseconds"""
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True, env=env)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main(runs: int = 10):
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, USERPROFILE=home)
+        baseline = measure('pass', runs, env)
+        lazy = measure(CREATE_APP, runs, env)
+        eager = measure(f'{EAGER_IMPORTS}; {CREATE_APP}', runs, env)
+
+    print(f'runs: {runs} (best of)')
+    print(f'empty interpreter:      {baseline:8.1f} ms')
+    print(f'eager create_app:       {eager:8.1f} ms')
+    print(f'lazy create_app:        {lazy:8.1f} ms')
+    print(f'startup saved:          {eager - lazy:8.1f} ms ({(eager - baseline) / (lazy - baseline):.2f}x faster excluding interpreter start)')
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
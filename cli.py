@@ -0,0 +1,11 @@
+# cli.py
+import sys
+from src.cli import main
+
+"""
+Command line entry point for bulk drive operations (ls, find, get, put, rm, sync, du).
+Uses the credentials saved by the web app. Run python cli.py --help for usage.
+"""
+
+if __name__ == "__main__":
+    sys.exit(main())
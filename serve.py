@@ -0,0 +1,11 @@
+# serve.py
+from src.server import main
+
+"""
+Production entry point to the flask application.
+Serves the app with gunicorn worker processes and threads, configured through the STRAC_* server settings.
+Use run.py for local development.
+"""
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import json
+from flask import Flask, Response, jsonify, request, stream_with_context
+from src.drive.dedupe import find_duplicates, redundant_file_ids, trash_files
+from src.drive.usage import analyze_usage, DEFAULT_TOP_N
+
+
+#bounds of the page_size query parameter, the drive api doesn't return more than 1000 files per page
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+NDJSON_MIME_TYPE = 'application/x-ndjson'
+
+
+def _page_size(default: int = DEFAULT_PAGE_SIZE) -> int:
+    try:
+        page_size = int(request.args.get('page_size', default))
+    except ValueError:
+        page_size = default
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+def _wants_ndjson() -> bool:
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIME_TYPE
+
+def api_error(message: str, status: int = 500):
+    """Json error body shared by the api routes"""
+    response = jsonify({'error': message})
+    response.status_code = status
+    return response
+
+def register_api_routes(app: Flask):
+    """Register the json api routes for automation. These sit next to the html routes and share the same drive client"""
+
+    @app.route('/api/files')
+    def api_list_files():
+        """
+        Lists files as json. Returns one page per request with a cursor for the next page.
+        With ?format=ndjson (or Accept: application/x-ndjson) every page is streamed as newline delimited json as soon as it arrives
+        """
+        drive_client = app.config['drive_client']
+        cursor = request.args.get('cursor') or None
+
+        if _wants_ndjson():
+            page_size = _page_size(MAX_PAGE_SIZE)
+
+            def generate():
+                try:
+                    #one chunk per drive page keeps memory constant and gets the first rows out early
+                    for files in drive_client.iter_file_pages(page_size=page_size, page_token=cursor):
+                        if files:
+                            yield ''.join(json.dumps(file) + '\n' for file in files)
+                except Exception as e:
+                    #the status line is already sent so the failure is reported as a final record
+                    yield json.dumps({'error': f'Error listing files: {str(e)}'}) + '\n'
+            return Response(stream_with_context(generate()), mimetype=NDJSON_MIME_TYPE)
+
+        try:
+            page = drive_client.list_files_page(cursor, _page_size())
+        except Exception as e:
+            return api_error(f'Error listing files: {str(e)}')
+        return jsonify({'files': page['files'], 'nextCursor': page['nextPageToken']})
+
+    @app.route('/api/drives')
+    def api_list_drives():
+        """Lists the shared drives the user is a member of"""
+        try:
+            return jsonify({'drives': app.config['drive_client'].list_drives()})
+        except Exception as e:
+            return api_error(f'Error listing drives: {str(e)}')
+
+    @app.route('/api/duplicates')
+    def api_duplicates():
+        """Scans the files the user owns for duplicate uploads and reports the groups and the bytes that could be reclaimed"""
+        try:
+            return jsonify(find_duplicates(app.config['drive_client']))
+        except Exception as e:
+            return api_error(f'Error finding duplicates: {str(e)}')
+
+    @app.route('/api/storage')
+    def api_storage():
+        """
+        Reports storage usage: per folder totals summed over subfolders and the largest folders, files and mime types.
+        ?folder_id limits the scan to a subtree, ?top sets the number of entries per list
+        """
+        top_n = max(1, min(request.args.get('top', DEFAULT_TOP_N, type=int), MAX_PAGE_SIZE))
+        include_shared_drives = request.args.get('shared_drives', '').lower() in ('1', 'true', 'yes')
+        try:
+            return jsonify(analyze_usage(app.config['drive_client'], request.args.get('folder_id') or None, include_shared_drives, top_n))
+        except Exception as e:
+            return api_error(f'Error analyzing storage: {str(e)}')
+
+    @app.route('/api/duplicates/delete', methods=['POST'])
+    def api_delete_duplicates():
+        """
+        Moves the duplicates selected by the caller to the trash. Expects a json body of the form {"fileIds": [...]}.
+        The ids are checked against a fresh scan: only redundant copies are trashed, so the oldest copy of every group is
+        always kept, and anything else is returned as rejected
+        """
+        body = request.get_json(silent=True) or {}
+        file_ids = body.get('fileIds')
+        if not isinstance(file_ids, list) or not all(isinstance(file_id, str) for file_id in file_ids):
+            return api_error('fileIds must be a list of file ids', 400)
+        drive_client = app.config['drive_client']
+        try:
+            redundant = set(redundant_file_ids(find_duplicates(drive_client)))
+        except Exception as e:
+            return api_error(f'Error finding duplicates: {str(e)}')
+        results = trash_files(drive_client, [file_id for file_id in file_ids if file_id in redundant])
+        return jsonify({'trashed': [file_id for file_id, ok in results.items() if ok],
+                        'failed': [file_id for file_id, ok in results.items() if not ok],
+                        'rejected': [file_id for file_id in file_ids if file_id not in redundant]})
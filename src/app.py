@@ -1,48 +1,155 @@
-from flask import Flask, render_template, request, redirect, url_for, send_file, flash
+from flask import Flask, render_template, request, redirect, url_for, send_file, flash, g, session, make_response, Response, stream_with_context
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import is_resource_modified
 from src.interfaces.interface import Config, AuthProvider
 from .config import DefaultDriveConfig
 from .auth.auth_manager import OAuthManager
 from .drive.driveclient import DriveClient
+from .drive.cache import ContentCache
+from .drive.enrichment import format_timestamps
+from .drive.archive import ArchiveStreamer
+from .drive.usage import analyze_usage, DEFAULT_TOP_N
+from .drive.watch import ChangeWatcher, CHANNEL_TOKEN_HEADER, RESOURCE_STATE_HEADER
+from .api import register_api_routes, MAX_PAGE_SIZE
 import os
 from datetime import datetime
+from typing import Optional
 import tempfile
-from src.utils.utils import path_leaf
+from src.utils.utils import path_leaf, format_size
+from src.utils.tracing import create_tracer
+from src.utils.http_cache import listing_etag, file_validators
+from src.utils.compression import register_compression
+from contextlib import ExitStack
 
 def create_app() -> Flask:
     """Create and configure the Flask application"""
     
     # Initialize our components
     config = DefaultDriveConfig()
-    auth_manager = OAuthManager(config)
-    drive_client = DriveClient(auth_manager)
+    tracer = create_tracer(config.trace_file, config.use_opentelemetry)
+    auth_manager = OAuthManager(config, tracer=tracer)
+    content_cache = ContentCache(config.cache_dir, config.cache_max_bytes) if config.cache_max_bytes > 0 else None
+    drive_client = DriveClient(auth_manager, tracer=tracer, content_cache=content_cache)
+    #with a webhook address the listing is served from a snapshot kept fresh by drive push notifications
+    change_watcher = ChangeWatcher(
+        drive_client, config.watch_address, config.watch_token, ttl=config.watch_ttl,
+        include_shared_drives=config.include_shared_drives, local=config.watch_local, poll_interval=config.watch_poll_interval,
+        lock_file=str(config.watch_lock_file)
+    ) if config.watch_address else None
     
     # Create Flask app
     app = Flask(__name__)
     
     # Store our components in app config
+    app.config['drive_config'] = config
+    app.config['tracer'] = tracer
     app.config['auth_manager'] = auth_manager
     app.config['drive_client'] = drive_client
+    app.config['change_watcher'] = change_watcher
     
-    # Register routes
+    # Register request tracing, response compression and routes
+    register_tracing(app)
+    register_compression(app, config.compression_min_size, config.compression_level)
     register_routes(app)
+    register_api_routes(app)
     
     return app
 
+def register_tracing(app: Flask):
+    """Open a span for every request so drive and auth spans recorded while handling it are nested under the route"""
+
+    @app.before_request
+    def start_request_span():
+        tracer = app.config['tracer']
+        g.trace_stack = ExitStack()
+        g.request_span = g.trace_stack.enter_context(tracer.start_span(
+            f'route.{request.endpoint}',
+            {'http.method': request.method, 'http.path': request.path}
+        ))
+
+    @app.after_request
+    def record_response(response):
+        span = g.get('request_span')
+        if span is not None:
+            span.set_attribute('http.status_code', response.status_code)
+            span.set_attribute('http.response_size', response.content_length)
+        return response
+
+    @app.teardown_request
+    def end_request_span(exc):
+        trace_stack = g.pop('trace_stack', None)
+        if trace_stack is not None:
+            if exc is not None:
+                g.request_span.record_exception(exc)
+            trace_stack.close()
+
+def not_modified(app: Flask, etag: str, weak: bool = False):
+    """Build an empty 304 response carrying the validator the client already holds"""
+    response = app.response_class(status=304)
+    response.set_etag(etag, weak=weak)
+    return response
+
+def send_download(app: Flask, path: str, filename: str, etag: Optional[str], weak: bool, last_modified: Optional[datetime]):
+    """Send a downloaded file as an attachment with its cache validators"""
+    with app.config['tracer'].start_span('download.send_file', {'file.size': os.path.getsize(path)}):
+        #exports aren't byte stable across requests so ranges are only served for strong etags
+        response = send_file(
+            path,
+            as_attachment=True,
+            download_name=filename,
+            conditional=not weak,
+            etag=etag if etag and not weak else False,
+            last_modified=last_modified
+        )
+        if etag and weak:
+            response.set_etag(etag, weak=True)
+    return response
+
 def register_routes(app: Flask):
     """Register all routes for the application"""
+
+    app.add_template_filter(format_size, 'filesize')
     
     @app.route('/')
     def index():
-        """Home page showing list of files and upload form"""
+        """Home page showing list of files and upload form. Answers conditional requests with 304 when the drive hasn't changed"""
         try:
             drive_client = app.config['drive_client']
-            files = drive_client.list_files()
-            # Convert timestamp to more readable format
+            change_watcher = app.config.get('change_watcher')
+            #pending flash messages must be rendered so the page can't be served from the browser cache
+            cacheable = not session.get('_flashes')
+            change_token = None
+            if change_watcher is not None:
+                #the snapshot is checked against the current change token, which then validates it without listing
+                files = change_watcher.list_files()
+                change_token = change_watcher.page_token
+                if cacheable and change_token and request.if_none_match.contains_weak(listing_etag(change_token)):
+                    return not_modified(app, listing_etag(change_token), weak=True)
+            else:
+                if cacheable:
+                    try:
+                        change_token = drive_client.get_change_token()
+                    except Exception as e:
+                        print(f"Error fetching change token: {str(e)}")
+                    #the change token is enough to validate the listing so a match skips listing entirely
+                    if change_token and request.if_none_match.contains_weak(listing_etag(change_token)):
+                        return not_modified(app, listing_etag(change_token), weak=True)
+
+                files = drive_client.list_files(include_shared_drives=app.config['drive_config'].include_shared_drives)
+            etag = listing_etag(change_token, files)
+            drive_client.remember_listing(files)
+            # Convert timestamp to more readable format, each unique timestamp is parsed once
             for file in files:
-                timestamp = datetime.fromisoformat(file['modifiedTime'].replace('Z', '+00:00'))
                 file['type'] = file['mimeType']
-                file['modifiedTime'] = timestamp.strftime('%Y-%m-%d %H:%M:%S')
-            return render_template('index.html', files=files)
+                file['exportFormats'] = DriveClient.EXPORT_OPTIONS.get(file['mimeType'], [])
+            format_timestamps(files)
+            response = make_response(render_template('index.html', files=files))
+            if cacheable:
+                response.set_etag(etag, weak=True)
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+                response = response.make_conditional(request)
+            return response
         except Exception as e:
             flash(f'Error loading files: {str(e)}', 'error')
             return render_template('index.html', files=[])
@@ -66,12 +173,22 @@ def register_routes(app: Flask):
             file.save(temp_path)
 
             drive_client = app.config['drive_client']
-            uploaded_file = drive_client.upload_file(temp_path)
+            #with dedupe an identical same named file is kept and a changed one updated in place instead of adding a copy
+            dedupe = request.form.get('dedupe') in ('1', 'on', 'true')
+            uploaded_file = drive_client.upload_file(temp_path, dedupe=dedupe)
+            action = uploaded_file.get('uploadAction', 'created')
+            if action != 'skipped' and app.config.get('change_watcher') is not None:
+                app.config['change_watcher'].mark_dirty()
             
             os.remove(temp_path)
             os.rmdir(temp_dir)
 
-            flash(f'Successfully uploaded {filename}', 'success')
+            if action == 'skipped':
+                flash(f'{filename} is already in your drive, upload skipped', 'success')
+            elif action == 'updated':
+                flash(f'Successfully updated {filename}', 'success')
+            else:
+                flash(f'Successfully uploaded {filename}', 'success')
         except Exception as e:
             flash(f'Error uploading file: {str(e)}', 'error')
 
@@ -79,22 +196,34 @@ def register_routes(app: Flask):
 
     @app.route('/download/<file_id>/<filename>')
     def download_file(file_id, filename):
-        """Post method that handles file download"""
+        """
+        Get method that handles file download. Conditional requests are answered with 304 before anything is downloaded
+        and binary files support range requests so interrupted downloads can be resumed.
+        Google Workspace files can be exported to another format with ?format=pdf (csv, odt, txt, ...)
+        """
         try:
+            drive_client = app.config['drive_client']
+            export_format = request.args.get('format') or None
+            #exports started from a recent listing take its revision, kept server side, instead of fetching metadata.
+            #binary files always fetch metadata since their md5Checksum is what enables strong etags and range requests
+            metadata = drive_client.listing_revision(file_id) or drive_client.get_file_metadata(file_id)
+            etag, weak, last_modified = file_validators(metadata, export_format)
+            if etag and not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                return not_modified(app, etag, weak=weak)
+
+            #serve straight from the content cache when the file revision can be cached
+            cached_path = drive_client.get_cached_path(file_id, metadata, export_format)
+            if cached_path:
+                return send_download(app, cached_path, filename, etag, weak, last_modified)
+
             temp_dir = tempfile.mkdtemp()
             temp_path = os.path.join(temp_dir, filename)
             
             try:
-                drive_client = app.config['drive_client']
-                success = drive_client.download_file(file_id, temp_path)
+                success = drive_client.download_file(file_id, temp_path, metadata=metadata, export_format=export_format)
                 
                 if success and os.path.exists(temp_path):
-                    return_data = send_file(
-                        temp_path,
-                        as_attachment=True,
-                        download_name=filename
-                    )
-                    return return_data
+                    return send_download(app, temp_path, filename, etag, weak, last_modified)
                 else:
                     flash('Error downloading file', 'error')
                     return redirect(url_for('index'))
@@ -109,16 +238,73 @@ def register_routes(app: Flask):
                 except Exception as e:
                     print(f"Error cleaning up temporary files: {str(e)}")
                     
+        except HTTPException:
+            #let werkzeug answer unsatisfiable ranges with 416
+            raise
         except Exception as e:
             flash(f'Error downloading file: {str(e)}', 'error')
             return redirect(url_for('index'))
 
+    @app.route('/download-zip', methods=['GET', 'POST'])
+    def download_zip():
+        """
+        Streams several files as one zip archive. Takes either a folder_id, whose whole subtree is archived,
+        or one or more file_id values. Files are fetched with a bounded number in flight and written to the response as they arrive
+        """
+        folder_id = request.values.get('folder_id')
+        file_ids = request.values.getlist('file_id')
+        if not folder_id and not file_ids:
+            flash('No folder or files selected', 'error')
+            return redirect(url_for('index'))
+
+        streamer = ArchiveStreamer(app.config['drive_client'], max_in_flight=app.config['drive_config'].archive_max_in_flight)
+        entries = streamer.folder_entries(folder_id) if folder_id else streamer.file_entries(file_ids)
+        archive_name = path_leaf(request.values.get('name') or 'drive-files.zip').replace('"', '')
+        if not archive_name.endswith('.zip'):
+            archive_name += '.zip'
+        return Response(
+            stream_with_context(streamer.stream(entries)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{archive_name}"'}
+        )
+
+    @app.route('/storage')
+    def storage():
+        """Storage usage report: totals per top level folder and the largest folders, files and mime types. ?folder_id limits it to a subtree"""
+        try:
+            report = analyze_usage(
+                app.config['drive_client'],
+                folder_id=request.args.get('folder_id') or None,
+                include_shared_drives=app.config['drive_config'].include_shared_drives,
+                top_n=max(1, min(request.args.get('top', DEFAULT_TOP_N, type=int), MAX_PAGE_SIZE))
+            )
+        except Exception as e:
+            flash(f'Error analyzing storage: {str(e)}', 'error')
+            return redirect(url_for('index'))
+        return render_template('storage.html', report=report)
+
+    @app.route('/notifications/drive', methods=['POST'])
+    def drive_notification():
+        """
+        Webhook for drive push notifications (changes().watch channels). Answers right away, the changes are applied
+        to the listing snapshot in the background. Requests without the channel's secret token are rejected
+        """
+        change_watcher = app.config.get('change_watcher')
+        if change_watcher is None:
+            return '', 404
+        if not change_watcher.verify(request.headers.get(CHANNEL_TOKEN_HEADER)):
+            return '', 403
+        change_watcher.notify(request.headers.get(RESOURCE_STATE_HEADER, ''))
+        return '', 204
+
     @app.route('/delete/<file_id>', methods=['POST'])
     def delete_file(file_id):
         """Handle file deletion"""
         try:
             drive_client = app.config['drive_client']
             if drive_client.delete_file(file_id):
+                if app.config.get('change_watcher') is not None:
+                    app.config['change_watcher'].mark_dirty()
                 flash('File deleted successfully', 'success')
             else:
                 flash('Error deleting file', 'error')
@@ -1,17 +1,23 @@
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
 import json
 import os
 from typing import Optional, Any
-from src.interfaces.interface import AuthProvider, Config
+from src.interfaces.interface import AuthProvider, Config, Tracer
+from src.utils.tracing import NoOpTracer
+from src.utils.lazy import LazyImport
+
+#google auth libraries are imported on first use, credentials are only needed once the drive is accessed
+Credentials = LazyImport('google.oauth2.credentials', 'Credentials')
+InstalledAppFlow = LazyImport('google_auth_oauthlib.flow', 'InstalledAppFlow')
+Request = LazyImport('google.auth.transport.requests', 'Request')
 
 
 class OAuthManager(AuthProvider):
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, tracer: Optional[Tracer] = None):
         """Initialize the OAuthManager"""
         self.config = config
-        self._credentials: Optional[Credentials] = None
+        self.tracer = tracer or NoOpTracer()
+        #google.oauth2.credentials.Credentials once loaded
+        self._credentials: Optional[Any] = None
         self._testing = False  # Add this flag
 
     def get_credentials(self) -> Any:
@@ -52,13 +58,16 @@ class OAuthManager(AuthProvider):
         if not self._credentials:
             return False
             
-        try:
-            self._credentials.refresh(Request())
-            return True
-        except Exception as e:
-            print(f"Error refreshing credentials: {str(e)}")
-            self._credentials = None
-            return False
+        with self.tracer.start_span('auth.refresh_credentials') as span:
+            try:
+                self._credentials.refresh(Request())
+                span.set_attribute('success', True)
+                return True
+            except Exception as e:
+                print(f"Error refreshing credentials: {str(e)}")
+                span.set_attribute('success', False)
+                self._credentials = None
+                return False
 
     def _load_credentials(self) -> None:
         """Load credentials from file if they exist"""
@@ -100,7 +109,8 @@ class OAuthManager(AuthProvider):
                 self.config.secrets,
                 self.config.scopes
             )
-            self._credentials = flow.run_local_server(port=0)
+            with self.tracer.start_span('auth.oauth_flow'):
+                self._credentials = flow.run_local_server(port=0)
         except Exception as e:
             print(f"Error running OAuth flow: {str(e)}")
             self._credentials = None
\ No newline at end of file
@@ -0,0 +1,511 @@
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import posixpath
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from src.drive.driveclient import DriveClient
+from src.drive.usage import analyze_usage, DEFAULT_TOP_N
+from src.utils.http_cache import parse_drive_time
+from src.utils.utils import format_size
+
+"""
+Command line tool for bulk drive operations. Talks to the drive api directly through DriveClient with the credentials
+saved by OAuthManager, so batch jobs don't need the flask app running.
+
+Drive paths are '/' separated folder and file names starting at the root of my drive (e.g. Reports/2024/*.pdf).
+Any path component may be a glob pattern, and 'id:<file id>' addresses a file by id.
+
+Usage: python cli.py <command> [options], see python cli.py --help
+"""
+
+#fields requested for every listed item. size and md5Checksum are missing for google workspace files and folders
+ITEM_FIELDS = 'id, name, mimeType, size, md5Checksum, modifiedTime'
+
+GLOB_CHARS = '*?['
+
+
+class CliError(Exception):
+    """Error reported to the user without a traceback"""
+
+
+class Output:
+    """
+    Writes command results to stdout, as aligned text or as one json object per line with --json, and progress to stderr.
+    Safe to use from the transfer threads
+    """
+
+    def __init__(self, as_json: bool = False, quiet: bool = False, stdout=None, stderr=None):
+        self.as_json = as_json
+        self.quiet = quiet
+        self.stdout = stdout or sys.stdout
+        self.stderr = stderr or sys.stderr
+        self._lock = threading.Lock()
+
+    def result(self, record: Dict[str, Any], text: str) -> None:
+        with self._lock:
+            self.stdout.write((json.dumps(record) if self.as_json else text) + '\n')
+            self.stdout.flush()
+
+    def progress(self, message: str) -> None:
+        if self.quiet:
+            return
+        with self._lock:
+            self.stderr.write(message + '\n')
+            self.stderr.flush()
+
+
+def make_client() -> DriveClient:
+    """DriveClient authenticated with the credentials saved by the web app (or a fresh oauth flow)"""
+    from src.config import DefaultDriveConfig
+    from src.auth.auth_manager import OAuthManager
+    from src.utils.file_hashes import FileHashCache
+    config = DefaultDriveConfig()
+    return DriveClient(OAuthManager(config), hash_cache=FileHashCache(config.hash_cache_file))
+
+def is_folder(item: Dict[str, Any]) -> bool:
+    return item.get('mimeType') == DriveClient.FOLDER_MIME_TYPE
+
+def full_path(item: Dict[str, Any]) -> str:
+    """Drive path of an item from its containing folder path and name"""
+    return posixpath.join(item['path'], item['name']) if item.get('path') else item.get('name', '')
+
+def item_size(item: Dict[str, Any]) -> Optional[int]:
+    return int(item['size']) if item.get('size') is not None else None
+
+def is_workspace_file(item: Dict[str, Any]) -> bool:
+    """Whether the item is a Google Workspace file that is exported rather than downloaded"""
+    return item.get('mimeType') in DriveClient.GOOGLE_MIME_TYPES
+
+def export_extension(export_format: str) -> str:
+    """File extension for an export format given by short name or full mime type"""
+    if export_format.lower() in DriveClient.EXPORT_FORMATS:
+        return '.' + export_format.lower()
+    for short_name, mime_type in DriveClient.EXPORT_FORMATS.items():
+        if mime_type == export_format:
+            return '.' + short_name
+    return ''
+
+def local_name(item: Dict[str, Any], export_format: Optional[str] = None) -> Optional[str]:
+    """
+    Local file name of a drive file. Workspace files get the extension of their export (export_format when given,
+    otherwise the default export), items without content return None
+    """
+    mime_type = item.get('mimeType', '')
+    name = item['name'].replace('/', '_')
+    if is_workspace_file(item):
+        if export_format:
+            return name + export_extension(export_format)
+        return name + DriveClient.GOOGLE_MIME_TYPES[mime_type]['extension']
+    if mime_type.startswith('application/vnd.google-apps.'):
+        return None
+    return name
+
+def item_record(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'id': item['id'],
+        'path': full_path(item),
+        'mimeType': item.get('mimeType'),
+        'size': item_size(item),
+        'modifiedTime': item.get('modifiedTime'),
+    }
+
+def root_item() -> Dict[str, Any]:
+    return {'id': 'root', 'name': '', 'path': '', 'mimeType': DriveClient.FOLDER_MIME_TYPE}
+
+def resolve(drive: DriveClient, path: str) -> List[Dict[str, Any]]:
+    """
+    Resolve a drive path to the items it names, expanding glob components one folder level at a time
+
+    Args:
+        drive: DriveClient used for the lookups
+        path: Drive path, '' or '/' for the root, or 'id:<file id>'
+
+    Returns:
+        Matching items, each with a 'path' of its containing folder
+    """
+    if path.startswith('id:'):
+        try:
+            item = drive.get_file_metadata(path[3:])
+        except Exception as e:
+            raise CliError(f'No such file id: {path[3:]} ({str(e)})')
+        item['path'] = ''
+        return [item]
+
+    items = [root_item()]
+    for part in (part for part in path.strip('/').split('/') if part):
+        matches = []
+        for parent in items:
+            if not is_folder(parent):
+                continue
+            if any(c in part for c in GLOB_CHARS):
+                children = [child for child in drive.list_children(parent['id'], fields=ITEM_FIELDS)
+                            if fnmatch.fnmatchcase(child['name'], part)]
+            else:
+                children = drive.list_children(parent['id'], name=part, fields=ITEM_FIELDS)
+            for child in children:
+                child['path'] = full_path(parent)
+            matches.extend(children)
+        items = matches
+        if not items:
+            raise CliError(f'No such file or folder: {path}')
+    return sorted(items, key=full_path)
+
+def resolve_folder(drive: DriveClient, path: str) -> Dict[str, Any]:
+    """Resolve a drive path that must name exactly one folder"""
+    items = resolve(drive, path)
+    if len(items) != 1 or not is_folder(items[0]):
+        raise CliError(f'Not a single folder: {path}')
+    return items[0]
+
+def walk(drive: DriveClient, folder: Dict[str, Any], fields: str = ITEM_FIELDS) -> Iterator[Dict[str, Any]]:
+    """Walk a folder subtree. Yielded items carry 'relative_path', their path below the folder, besides the drive 'path'"""
+    base = full_path(folder)
+    for item in drive.walk(folder['id'], fields=fields):
+        item['relative_path'] = posixpath.join(item['path'], item['name']) if item['path'] else item['name']
+        item['path'] = posixpath.join(base, item['path']) if base else item['path']
+        yield item
+
+def local_files(paths: List[str], recursive: bool) -> Iterator[Tuple[str, str]]:
+    """
+    Expand local paths (including glob patterns, which some shells leave alone) to files.
+    Yields (local path, relative path below the argument) pairs. Directories are descended into when recursive
+    """
+    for pattern in paths:
+        matches = glob.glob(pattern) if any(c in pattern for c in GLOB_CHARS) else [pattern]
+        if not matches:
+            raise CliError(f'No such local file: {pattern}')
+        for path in matches:
+            if os.path.isdir(path):
+                if not recursive:
+                    raise CliError(f'{path} is a directory (use -r)')
+                base = os.path.basename(os.path.normpath(path))
+                for dirpath, _, filenames in os.walk(path):
+                    for filename in sorted(filenames):
+                        local = os.path.join(dirpath, filename)
+                        yield local, posixpath.join(base, os.path.relpath(local, path).replace(os.sep, '/'))
+            elif os.path.isfile(path):
+                yield path, os.path.basename(path)
+            else:
+                raise CliError(f'No such local file: {path}')
+
+def run_transfers(out: Output, action: str, jobs: int, transfers: List[Tuple[Dict[str, Any], Callable[[], Any]]]) -> int:
+    """
+    Run transfers on a thread pool, reporting each one as it completes
+
+    Args:
+        out: Output for results and progress
+        action: Name of the operation for the records (get, put, update, rm)
+        jobs: Maximum number of concurrent transfers
+        transfers: (result record, function) pairs. The function returns False or raises on failure
+
+    Returns:
+        Number of failed transfers
+    """
+    if not transfers:
+        return 0
+    failures = 0
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix=f'drive-{action}') as executor:
+        futures = {executor.submit(fn): record for record, fn in transfers}
+        for future in as_completed(futures):
+            record = dict(futures[future], action=action)
+            done += 1
+            try:
+                record['ok'] = future.result() is not False
+            except Exception as e:
+                record['ok'] = False
+                record['error'] = str(e)
+            if not record['ok']:
+                failures += 1
+            out.progress(f"[{done}/{len(transfers)}] {action} {record['source']}{'' if record['ok'] else ' FAILED'}")
+            status = 'ok' if record['ok'] else f"failed: {record.get('error', 'see above')}"
+            target = f" -> {record['destination']}" if 'destination' in record else ''
+            out.result(record, f"{action}\t{record['source']}{target}\t{status}")
+    return failures
+
+
+def cmd_ls(drive: DriveClient, args, out: Output) -> int:
+    """List files. Folders are listed by their contents unless -d, and their whole subtree with -r"""
+    for path in args.paths or ['']:
+        for item in resolve(drive, path):
+            if is_folder(item) and not args.directory:
+                if args.recursive:
+                    entries = walk(drive, item)
+                else:
+                    entries = drive.list_children(item['id'], fields=ITEM_FIELDS)
+                    for entry in entries:
+                        entry['path'] = full_path(item)
+                    entries = sorted(entries, key=lambda entry: (not is_folder(entry), entry['name'].lower()))
+            else:
+                entries = [item]
+            for entry in entries:
+                out.result(item_record(entry), '\t'.join((
+                    'd' if is_folder(entry) else '-',
+                    f"{format_size(item_size(entry)):>7}",
+                    (entry.get('modifiedTime') or '')[:19].replace('T', ' '),
+                    full_path(entry) + ('/' if is_folder(entry) else ''),
+                )))
+    return 0
+
+def cmd_find(drive: DriveClient, args, out: Output) -> int:
+    """Search a folder subtree by name pattern and type"""
+    for folder in (resolve_folder(drive, path) for path in args.paths or ['']):
+        for item in walk(drive, folder):
+            if args.name and not fnmatch.fnmatchcase(item['name'], args.name):
+                continue
+            if args.type and args.type != ('d' if is_folder(item) else 'f'):
+                continue
+            out.result(item_record(item), full_path(item))
+    return 0
+
+def cmd_get(drive: DriveClient, args, out: Output) -> int:
+    """Download files and folders. Folders are downloaded with their structure below the destination"""
+    items = [item for source in args.sources for item in resolve(drive, source)]
+    into_directory = len(items) > 1 or os.path.isdir(args.dest) or args.dest.endswith(('/', os.sep)) or any(map(is_folder, items))
+
+    transfers = []
+    for item in items:
+        if is_folder(item):
+            targets = [(entry, os.path.join(args.dest, item['name'], *entry['relative_path'].split('/')[:-1]))
+                       for entry in walk(drive, item) if not is_folder(entry)]
+        else:
+            targets = [(item, args.dest)]
+        for entry, directory in targets:
+            #--format only applies to workspace files, binary files in the same selection are downloaded as they are
+            export_format = args.format if is_workspace_file(entry) else None
+            name = local_name(entry, export_format)
+            if name is None:
+                out.progress(f"skipping {full_path(entry)}: {entry.get('mimeType')} has no downloadable content")
+                continue
+            destination = os.path.join(directory, name) if into_directory else directory
+            record = {'id': entry['id'], 'source': full_path(entry), 'destination': destination}
+            transfers.append((record, lambda entry=entry, destination=destination, export_format=export_format:
+                              drive.download_file(entry['id'], destination, metadata=entry, export_format=export_format,
+                                                  raise_errors=True)))
+    return 1 if run_transfers(out, 'get', args.jobs, transfers) else 0
+
+def _ensure_folder(drive: DriveClient, folders: Dict[str, str], relative_path: str) -> str:
+    """Id of the folder at relative_path below the folder registered under '', creating missing folders along the way"""
+    if relative_path in folders:
+        return folders[relative_path]
+    parent, name = posixpath.split(relative_path)
+    parent_id = _ensure_folder(drive, folders, parent)
+    existing = [child for child in drive.list_children(parent_id, name=name, fields=ITEM_FIELDS) if is_folder(child)]
+    folders[relative_path] = existing[0]['id'] if existing else drive.create_folder(name, parent_id)['id']
+    return folders[relative_path]
+
+def cmd_put(drive: DriveClient, args, out: Output) -> int:
+    """Upload local files, and directories with -r, into a drive folder"""
+    folder = resolve_folder(drive, args.dest)
+    #folders are created up front on this thread so parallel uploads never race to create the same folder
+    folders = {'': folder['id']}
+    transfers = []
+    for local, relative in local_files(args.sources, args.recursive):
+        parent_id = _ensure_folder(drive, folders, posixpath.dirname(relative))
+        destination = posixpath.join(full_path(folder), relative)
+        transfers.append(({'source': local, 'destination': destination},
+                          lambda local=local, parent_id=parent_id: _put(drive, out, local, parent_id, args.dedupe)))
+    return 1 if run_transfers(out, 'put', args.jobs, transfers) else 0
+
+def _put(drive: DriveClient, out: Output, local: str, parent_id: str, dedupe: bool) -> bool:
+    file = drive.upload_file(local, parent_id, dedupe=dedupe)
+    if file.get('uploadAction') in ('skipped', 'updated'):
+        out.progress(f"{file['uploadAction']} {local}")
+    return True
+
+def cmd_rm(drive: DriveClient, args, out: Output) -> int:
+    """Delete files, and folders with -r. Deleting a folder deletes everything in it"""
+    items = [item for path in args.paths for item in resolve(drive, path)]
+    folders = [full_path(item) for item in items if is_folder(item)]
+    if folders and not args.recursive:
+        raise CliError(f"{folders[0]} is a folder (use -r)")
+    if args.dry_run:
+        for item in items:
+            out.result(dict(item_record(item), action='rm', dryRun=True), f'would remove {full_path(item)}')
+        return 0
+
+    #delete_file raises on failure, so run_transfers reports the error in the record instead of it being printed
+    transfers = [({'id': item['id'], 'source': full_path(item)}, lambda item=item: drive.delete_file(item['id'])) for item in items]
+    return 1 if run_transfers(out, 'rm', args.jobs, transfers) else 0
+
+def _sync_up(drive: DriveClient, args, out: Output) -> int:
+    """Upload new and changed files of a local directory into a drive folder. Unchanged files (same md5) are skipped"""
+    if not os.path.isdir(args.source):
+        raise CliError(f'Not a local directory: {args.source}')
+    folder = resolve_folder(drive, args.dest)
+    remote_files = {}
+    folders = {'': folder['id']}
+    for item in walk(drive, folder):
+        if is_folder(item):
+            folders[item['relative_path']] = item['id']
+        else:
+            remote_files[item['relative_path']] = item
+
+    transfers = []
+    for dirpath, _, filenames in os.walk(args.source):
+        for filename in sorted(filenames):
+            local = os.path.join(dirpath, filename)
+            relative = os.path.relpath(local, args.source).replace(os.sep, '/')
+            remote = remote_files.get(relative)
+            if remote is not None and item_size(remote) == os.path.getsize(local) and remote.get('md5Checksum') == drive.local_md5(local):
+                continue
+            record = {'source': local, 'destination': posixpath.join(full_path(folder), relative)}
+            if args.dry_run:
+                out.result(dict(record, action='update' if remote else 'put', dryRun=True), f"would upload {local}")
+            elif remote is not None:
+                transfers.append((dict(record, id=remote['id']), lambda local=local, file_id=remote['id']: drive.update_file(file_id, local)))
+            else:
+                parent_id = _ensure_folder(drive, folders, posixpath.dirname(relative))
+                transfers.append((record, lambda local=local, parent_id=parent_id: drive.upload_file(local, parent_id)))
+    return 1 if run_transfers(out, 'put', args.jobs, transfers) else 0
+
+def _up_to_date(drive: DriveClient, item: Dict[str, Any], local: str) -> bool:
+    """Whether a local copy matches a drive file. Binary files compare md5, workspace exports compare modification times"""
+    if not os.path.isfile(local):
+        return False
+    if item.get('md5Checksum'):
+        return item_size(item) == os.path.getsize(local) and item['md5Checksum'] == drive.local_md5(local)
+    modified = parse_drive_time(item.get('modifiedTime'))
+    return modified is not None and datetime.fromtimestamp(os.path.getmtime(local), timezone.utc) >= modified
+
+def _sync_down(drive: DriveClient, args, out: Output) -> int:
+    """Download new and changed files of a drive folder into a local directory"""
+    folder = resolve_folder(drive, args.source)
+    transfers = []
+    for item in walk(drive, folder):
+        name = local_name(item)
+        if is_folder(item) or name is None:
+            continue
+        local = os.path.join(args.dest, *item['relative_path'].split('/')[:-1], name)
+        if _up_to_date(drive, item, local):
+            continue
+        record = {'id': item['id'], 'source': full_path(item), 'destination': local}
+        if args.dry_run:
+            out.result(dict(record, action='get', dryRun=True), f'would download {full_path(item)}')
+        else:
+            transfers.append((record, lambda item=item, local=local: drive.download_file(item['id'], local, metadata=item, raise_errors=True)))
+    return 1 if run_transfers(out, 'get', args.jobs, transfers) else 0
+
+def cmd_sync(drive: DriveClient, args, out: Output) -> int:
+    """One way sync between a local directory and a drive folder"""
+    return _sync_up(drive, args, out) if args.direction == 'up' else _sync_down(drive, args, out)
+
+def cmd_du(drive: DriveClient, args, out: Output) -> int:
+    """Storage used below a folder per subfolder, optionally with the largest folders, files and mime types"""
+    folder = resolve_folder(drive, args.path)
+    #the whole drive is scanned with one flat listing, a subfolder has to be crawled
+    report = analyze_usage(drive, None if folder['id'] == 'root' else folder['id'],
+                           include_shared_drives=args.shared_drives, top_n=args.top or DEFAULT_TOP_N)
+    base = full_path(folder)
+
+    def prefix(path: str) -> str:
+        return posixpath.join(base, path) if base else path
+
+    for section in ('children', 'topFolders', 'topFiles'):
+        for entry in report[section]:
+            entry['path'] = prefix(entry['path'])
+    if out.as_json:
+        out.result(dict(report, path=base or '/'), '')
+        return 0
+
+    for entry in report['children']:
+        out.result(entry, f"{format_size(entry['bytes']):>7}\t{entry['path']}/")
+    loose = report['looseFiles']
+    if loose['fileCount']:
+        out.result(loose, f"{format_size(loose['bytes']):>7}\t({loose['fileCount']} files directly in {base or 'root'})")
+    out.result(report, f"{format_size(report['totalBytes']):>7}\ttotal ({report['fileCount']} files, {report['folderCount']} folders)")
+    if args.top:
+        out.result(report, '\nlargest folders:')
+        for entry in report['topFolders']:
+            out.result(entry, f"{format_size(entry['bytes']):>7}\t{entry['path']}/")
+        out.result(report, '\nlargest files:')
+        for entry in report['topFiles']:
+            out.result(entry, f"{format_size(entry['bytes']):>7}\t{entry['path']}")
+        out.result(report, '\nmime types:')
+        for entry in report['mimeTypes']:
+            out.result(entry, f"{format_size(entry['bytes']):>7}\t{entry['mimeType']} ({entry['fileCount']} files)")
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--json', action='store_true', help='print results as one json object per line')
+    common.add_argument('-q', '--quiet', action='store_true', help='no progress output on stderr')
+    transfer = argparse.ArgumentParser(add_help=False)
+    transfer.add_argument('-j', '--jobs', type=int, default=4, help='number of parallel transfers (default 4)')
+
+    parser = argparse.ArgumentParser(prog='cli.py', description='Bulk Google Drive operations')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ls = commands.add_parser('ls', parents=[common], help='list files')
+    ls.add_argument('paths', nargs='*', help='drive paths or globs (default: root)')
+    ls.add_argument('-r', '--recursive', action='store_true', help='list folder subtrees')
+    ls.add_argument('-d', '--directory', action='store_true', help='list folders themselves, not their contents')
+    ls.set_defaults(handler=cmd_ls)
+
+    find = commands.add_parser('find', parents=[common], help='search folder subtrees')
+    find.add_argument('paths', nargs='*', help='folders to search (default: root)')
+    find.add_argument('--name', help='glob the file name must match')
+    find.add_argument('--type', choices=('f', 'd'), help='only files (f) or folders (d)')
+    find.set_defaults(handler=cmd_find)
+
+    get = commands.add_parser('get', parents=[common, transfer], help='download files and folders')
+    get.add_argument('sources', nargs='+', help='drive paths or globs')
+    get.add_argument('dest', help='local file or directory')
+    get.add_argument('--format', help='export format for google workspace files (e.g. pdf, docx, csv)')
+    get.set_defaults(handler=cmd_get)
+
+    put = commands.add_parser('put', parents=[common, transfer], help='upload files')
+    put.add_argument('sources', nargs='+', help='local files or globs')
+    put.add_argument('dest', help='drive folder')
+    put.add_argument('-r', '--recursive', action='store_true', help='upload directories with their structure')
+    put.add_argument('--dedupe', action='store_true',
+                     help='skip files identical (md5) to a same named drive file and update changed ones in place instead of adding copies')
+    put.set_defaults(handler=cmd_put)
+
+    rm = commands.add_parser('rm', parents=[common, transfer], help='delete files')
+    rm.add_argument('paths', nargs='+', help='drive paths or globs')
+    rm.add_argument('-r', '--recursive', action='store_true', help='allow deleting folders and their contents')
+    rm.add_argument('--dry-run', action='store_true', help='only print what would be deleted')
+    rm.set_defaults(handler=cmd_rm)
+
+    sync = commands.add_parser('sync', parents=[common, transfer], help='one way sync of a directory and a drive folder')
+    sync.add_argument('direction', choices=('up', 'down'), help='up: local to drive, down: drive to local')
+    sync.add_argument('source', help='local directory (up) or drive folder (down)')
+    sync.add_argument('dest', help='drive folder (up) or local directory (down)')
+    sync.add_argument('--dry-run', action='store_true', help='only print what would be transferred')
+    sync.set_defaults(handler=cmd_sync)
+
+    du = commands.add_parser('du', parents=[common], help='storage used below a folder')
+    du.add_argument('path', nargs='?', default='', help='drive folder (default: root)')
+    du.add_argument('--top', type=int, default=0, help='also list the N largest folders, files and mime types')
+    du.add_argument('--shared-drives', action='store_true', help='include shared drives when scanning the whole drive')
+    du.set_defaults(handler=cmd_du)
+    return parser
+
+def main(argv: Optional[List[str]] = None, drive: Optional[DriveClient] = None) -> int:
+    """
+    Run the command line tool
+
+    Args:
+        argv: Arguments, defaults to sys.argv
+        drive: DriveClient to use, one authenticated with the saved credentials is created by default
+
+    Returns:
+        Exit status, 0 when everything succeeded
+    """
+    args = build_parser().parse_args(argv)
+    out = Output(as_json=args.json, quiet=args.quiet)
+    try:
+        return args.handler(drive or make_client(), args, out)
+    except CliError as e:
+        sys.stderr.write(f'error: {str(e)}\n')
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
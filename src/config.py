@@ -1,4 +1,6 @@
 from pathlib import Path
+import os
+import secrets
 from typing import Optional, List
 from src.interfaces.interface import Config
 import json
@@ -35,6 +37,51 @@ class DefaultDriveConfig(Config):
         #secret file that will be utilized to authenticate
         self.secrets = self.config_dir / 'secrets.json'
 
+        #optional json lines file that request traces are written to. Tracing is disabled when unset
+        self.trace_file = os.environ.get('STRAC_TRACE_FILE')
+        #forward spans to opentelemetry instead when the sdk is configured by the deployment
+        self.use_opentelemetry = os.environ.get('STRAC_TRACE_OTEL', '').lower() in ('1', 'true', 'yes')
+
+        #directory and byte budget of the downloaded content cache. A budget of 0 disables the cache
+        self.cache_dir = Path(os.environ.get('STRAC_CACHE_DIR', self.config_dir / 'cache'))
+        self.cache_max_bytes = int(os.environ.get('STRAC_CACHE_MAX_BYTES', 1024 ** 3))
+
+        #md5s of local files uploaded by the command line tool, so unchanged files aren't read again to be compared with drive
+        self.hash_cache_file = Path(os.environ.get('STRAC_HASH_CACHE', self.config_dir / 'upload_hashes.jsonl'))
+
+        #html and json responses at least this many bytes are gzip compressed for clients that accept it
+        self.compression_min_size = int(os.environ.get('STRAC_COMPRESS_MIN_SIZE', 500))
+        self.compression_level = int(os.environ.get('STRAC_COMPRESS_LEVEL', 6))
+
+        #whether the file listing includes the files of every shared drive the user is a member of. Off by default since
+        #shared drives are listed in full while my drive shows a single page
+        self.include_shared_drives = os.environ.get('STRAC_INCLUDE_SHARED_DRIVES', '').lower() in ('1', 'true', 'yes')
+
+        #number of files downloaded concurrently while streaming a zip archive
+        self.archive_max_in_flight = int(os.environ.get('STRAC_ARCHIVE_MAX_IN_FLIGHT', 4))
+
+        #https url of the /notifications/drive webhook. When set the file listing is kept fresh from drive push notifications
+        self.watch_address = os.environ.get('STRAC_WATCH_ADDRESS') or None
+        #secret drive echoes back with every notification, generated per run unless set
+        self.watch_token = os.environ.get('STRAC_WATCH_TOKEN') or secrets.token_urlsafe(24)
+        #requested lifetime of a notification channel in seconds, channels are renewed before they expire
+        self.watch_ttl = int(os.environ.get('STRAC_WATCH_TTL', 24 * 60 * 60))
+        #local development: poll for changes and post to the webhook ourselves instead of registering a channel with google
+        self.watch_local = os.environ.get('STRAC_WATCH_LOCAL', '').lower() in ('1', 'true', 'yes')
+        self.watch_poll_interval = float(os.environ.get('STRAC_WATCH_POLL_INTERVAL', 30))
+        #lock file that elects the one worker process opening the notification channel
+        self.watch_lock_file = Path(os.environ.get('STRAC_WATCH_LOCK_FILE', self.config_dir / 'watch.lock'))
+
+        #production server settings, see serve.py
+        self.server_bind = os.environ.get('STRAC_BIND', '0.0.0.0:8000')
+        self.server_workers = int(os.environ.get('STRAC_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+        self.server_threads = int(os.environ.get('STRAC_THREADS', 8))
+        #seconds a worker may go without heartbeating before it is restarted
+        self.server_timeout = int(os.environ.get('STRAC_TIMEOUT', 300))
+        #seconds in flight requests (including long downloads) get to finish on shutdown
+        self.server_graceful_timeout = int(os.environ.get('STRAC_GRACEFUL_TIMEOUT', 120))
+        self.server_keepalive = int(os.environ.get('STRAC_KEEPALIVE', 5))
+
         # Create config directory if it doesn't exist
         self.config_dir.mkdir(parents=True, exist_ok=True)
 
@@ -0,0 +1,186 @@
+import posixpath
+import queue
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from src.drive.driveclient import DriveClient
+
+
+#an archive entry: (file id, metadata, path inside the archive)
+ArchiveEntry = Tuple[str, Dict[str, Any], str]
+
+_END = object()
+
+
+class _ZipBuffer:
+    """
+    Write only file object zipfile writes into. It has no tell or seek so zipfile streams entries with data descriptors
+    instead of seeking back to patch headers, and whatever was written is drained after every chunk
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ArchiveStreamer:
+    """
+    Streams many drive files as a single zip without staging them to disk.
+    Up to max_in_flight files are downloaded concurrently ahead of the file being written. Each download hands its chunks over
+    through a bounded queue, so memory stays around max_in_flight * queue_chunks * chunk_size regardless of file sizes
+    """
+
+    def __init__(self, drive_client: DriveClient, max_in_flight: int = 4, chunk_size: int = DriveClient.DOWNLOAD_CHUNK_SIZE,
+                 queue_chunks: int = 2):
+        """
+        Args:
+            drive_client: DriveClient used to list and download files
+            max_in_flight: Maximum number of files downloaded at the same time
+            chunk_size: Size of each downloaded chunk in bytes
+            queue_chunks: Chunks buffered per in flight file before its download waits for the zip writer
+        """
+        self.drive_client = drive_client
+        self.max_in_flight = max_in_flight
+        self.chunk_size = chunk_size
+        self.queue_chunks = queue_chunks
+
+    def _archive_name(self, metadata: Dict[str, Any], path: str = '') -> Optional[str]:
+        """Path of a file inside the archive. Returns None for items that have no content (folders, forms, shortcuts)"""
+        mime_type = metadata.get('mimeType', '')
+        name = metadata.get('name') or metadata.get('id')
+        if mime_type in DriveClient.GOOGLE_MIME_TYPES:
+            name += DriveClient.GOOGLE_MIME_TYPES[mime_type]['extension']
+        elif mime_type.startswith('application/vnd.google-apps.'):
+            return None
+        #drive allows slashes in names, they'd create bogus directories in the archive
+        name = name.replace('/', '_')
+        return posixpath.join(path, name) if path else name
+
+    def folder_entries(self, folder_id: str) -> Iterator[ArchiveEntry]:
+        """Entries for every file in a folder subtree, keeping the folder structure. Listed lazily while the archive streams"""
+        for item in self.drive_client.walk(folder_id):
+            name = self._archive_name(item, item.get('path', ''))
+            if name:
+                yield item['id'], item, name
+
+    def file_entries(self, file_ids: Iterable[str]) -> Iterator[ArchiveEntry]:
+        """
+        Entries for a list of file ids. A file whose metadata can't be fetched (bad id, no access) still gets an entry,
+        named by its id and carrying the error, so the archive reports it instead of breaking off mid stream
+        """
+        for file_id in file_ids:
+            try:
+                metadata = self.drive_client.get_file_metadata(file_id)
+            except Exception as e:
+                yield file_id, {'id': file_id, 'error': f'Error fetching file metadata: {str(e)}'}, file_id
+                continue
+            name = self._archive_name(metadata)
+            if name:
+                yield file_id, metadata, name
+
+    def _download(self, file_id: str, metadata: Dict[str, Any], chunks: queue.Queue, cancelled: threading.Event) -> None:
+        """Worker: download a file into its queue. Blocks while the queue is full so a slow client throttles the downloads"""
+        def put(item):
+            while not cancelled.is_set():
+                try:
+                    chunks.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            if 'error' in metadata:
+                raise IOError(metadata['error'])
+            for chunk in self.drive_client.iter_content(file_id, metadata, chunk_size=self.chunk_size):
+                if not put(chunk):
+                    return
+            put(_END)
+        except Exception as e:
+            put(e)
+
+    def stream(self, entries: Iterable[ArchiveEntry]) -> Iterator[bytes]:
+        """
+        Generate the zip archive of the given entries. Files that fail to download get a '<name>.error.txt' entry instead.
+        A file that fails after some of it was streamed keeps the truncated '<name>' entry, and its error entry says it is incomplete
+
+        Args:
+            entries: (file id, metadata, archive path) tuples, typically from folder_entries or file_entries
+
+        Yields:
+            Bytes of the zip archive
+        """
+        buffer = _ZipBuffer()
+        cancelled = threading.Event()
+        used_names = set()
+        entries = iter(entries)
+        #downloads in flight, in archive order: (archive name, chunk queue)
+        in_flight: List[Tuple[str, queue.Queue]] = []
+
+        def submit_next(executor) -> bool:
+            entry = next(entries, None)
+            if entry is None:
+                return False
+            file_id, metadata, name = entry
+            chunks = queue.Queue(maxsize=self.queue_chunks)
+            in_flight.append((self._unique_name(name, used_names), chunks))
+            executor.submit(self._download, file_id, metadata, chunks, cancelled)
+            return True
+
+        executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='drive-zip')
+        try:
+            with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                while len(in_flight) < self.max_in_flight and submit_next(executor):
+                    pass
+                while in_flight:
+                    name, chunks = in_flight.pop(0)
+                    #the entry is only opened once the first chunk arrived, so a file that fails right away leaves no empty entry
+                    chunk = chunks.get()
+                    error = chunk if isinstance(chunk, Exception) else None
+                    partial = False
+                    if error is None:
+                        with archive.open(name, 'w', force_zip64=True) as dest:
+                            while chunk is not _END:
+                                if isinstance(chunk, Exception):
+                                    error, partial = chunk, True
+                                    break
+                                dest.write(chunk)
+                                yield buffer.drain()
+                                chunk = chunks.get()
+                    if error is not None:
+                        print(f"Error adding {name} to archive: {str(error)}")
+                        note = f'{name} in this archive is incomplete. ' if partial else ''
+                        archive.writestr(f'{name}.error.txt', f'{note}Error downloading file: {str(error)}\n')
+                    yield buffer.drain()
+                    #a slot freed up, start the next download
+                    submit_next(executor)
+            #the central directory is written when the archive closes
+            yield buffer.drain()
+        finally:
+            cancelled.set()
+            executor.shutdown(wait=False)
+
+    @staticmethod
+    def _unique_name(name: str, used_names: set) -> str:
+        """Drive allows several files with the same name in a folder. Later ones get a ' (n)' suffix"""
+        candidate = name
+        counter = 1
+        while candidate in used_names:
+            root, ext = posixpath.splitext(name)
+            candidate = f'{root} ({counter}){ext}'
+            counter += 1
+        used_names.add(candidate)
+        return candidate
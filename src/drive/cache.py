@@ -0,0 +1,197 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from src.utils.singleflight import SingleFlight
+
+
+class ContentCache:
+    """
+    On disk cache for downloaded and exported file contents.
+    Entries are keyed by file id plus a version (modifiedTime or md5Checksum) and the export type so a changed file never hits a stale entry.
+    The cache is bounded by a byte budget and evicts least recently used entries. Entries are written to a temporary file
+    and renamed into place so readers never observe a partial file.
+
+    The lru index is per process. Processes sharing a directory pick up entries the others wrote on a miss, and
+    each one enforces its own max_bytes, so under a pre-fork server every worker gets the budget divided by the worker count
+    """
+
+    #suffix of in progress writes. Leftovers from a crashed process are removed on startup
+    TEMP_SUFFIX = '.part'
+
+    def __init__(self, directory: str, max_bytes: int):
+        """
+        Args:
+            directory: Directory that cached contents are stored in. Created on first use if missing
+            max_bytes: Total size budget of the cache in bytes
+        """
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._fetches = SingleFlight()
+        #the directory is scanned on first use rather than at construction so startup doesn't pay for a large cache
+        self._index_loaded = False
+        self._index_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(file_id: str, metadata: Dict[str, Any], export_mime_type: Optional[str] = None) -> Optional[str]:
+        """
+        Build the cache key of a file revision. Returns None when the metadata carries no version information
+        since such a file can't be cached safely. modifiedTime is preferred since the listing already carries it,
+        so a download started from the listing produces the same key as one that fetched full metadata
+        """
+        version = metadata.get('modifiedTime') or metadata.get('md5Checksum') or metadata.get('headRevisionId')
+        if not version:
+            return None
+        return f"{file_id}:{version}:{export_mime_type or ''}"
+
+    @staticmethod
+    def _file_prefix(file_id: str) -> str:
+        #drive ids are url safe already, anything else is stripped so the id can't escape the cache directory
+        return ''.join(c for c in file_id if c.isalnum() or c in '-_') + '.'
+
+    def _path(self, key: str) -> str:
+        #entries are named by file id plus a digest of the full key so every revision of a file can be found by prefix
+        file_id = key.split(':', 1)[0]
+        return os.path.join(self.directory, self._file_prefix(file_id) + hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def _ensure_index(self) -> None:
+        if self._index_loaded:
+            return
+        with self._index_lock:
+            if not self._index_loaded:
+                os.makedirs(self.directory, exist_ok=True)
+                self._load_index()
+                self._index_loaded = True
+
+    def _load_index(self) -> None:
+        """Rebuild the lru order from disk using access times so the cache survives restarts"""
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(self.TEMP_SUFFIX):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            found.append((stat.st_atime, name, stat.st_size))
+
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total_bytes += size
+        self._evict()
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the path of a cached entry and marks it as recently used, or None on a miss"""
+        self._ensure_index()
+        path = self._path(key)
+        name = os.path.basename(path)
+        with self._lock:
+            known = name in self._entries
+            if known:
+                self._entries.move_to_end(name)
+        if not known:
+            #another process sharing the directory may have fetched it
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                return None
+            self._add(name, size)
+            return path
+        if not os.path.exists(path):
+            #removed from under us, forget about it
+            self._discard(name)
+            return None
+        return path
+
+    def get_or_fetch(self, key: str, fetch: Callable[[str], None]) -> str:
+        """
+        Return the path of a cached entry, fetching it first on a miss.
+        Concurrent callers for the same key wait for the first fetch instead of starting their own
+
+        Args:
+            key: Cache key built with make_key
+            fetch: Function that writes the content to the path it is given. Exceptions propagate to the caller
+
+        Returns:
+            Path of the cached content
+        """
+        path = self.get(key)
+        if path:
+            return path
+        path, _ = self._fetches.do(key, lambda: self._fetch_entry(key, fetch))
+        return path
+
+    def _fetch_entry(self, key: str, fetch: Callable[[str], None]) -> str:
+        """Fetch an entry into a temporary file and atomically move it into place"""
+        #a previous fetch may have completed between the miss and becoming the leader
+        path = self.get(key)
+        if path:
+            return path
+
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=self.TEMP_SUFFIX)
+        os.close(fd)
+        try:
+            fetch(temp_path)
+            path = self._path(key)
+            os.replace(temp_path, path)
+            self._add(os.path.basename(path), os.path.getsize(path))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return path
+
+    def invalidate(self, file_id: str) -> None:
+        """Drop every cached revision and export of a file"""
+        self._ensure_index()
+        prefix = self._file_prefix(file_id)
+        with self._lock:
+            names = [name for name in self._entries if name.startswith(prefix)]
+        for name in names:
+            self._discard(name)
+
+    def _add(self, name: str, size: int) -> None:
+        with self._lock:
+            if name in self._entries:
+                self._total_bytes -= self._entries[name]
+            self._entries[name] = size
+            self._entries.move_to_end(name)
+            self._total_bytes += size
+        #the new entry is kept even if it alone exceeds the budget since the caller is about to serve it
+        self._evict(keep=name)
+
+    def _discard(self, name: str) -> None:
+        with self._lock:
+            size = self._entries.pop(name, None)
+            if size is None:
+                return
+            self._total_bytes -= size
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Remove least recently used entries until the cache fits its budget"""
+        while True:
+            with self._lock:
+                candidates = (name for name in self._entries if name != keep)
+                name = next(candidates, None)
+                if self._total_bytes <= self.max_bytes or name is None:
+                    return
+            self._discard(name)
+
+    @property
+    def total_bytes(self) -> int:
+        self._ensure_index()
+        return self._total_bytes
@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Tuple
+from src.drive.driveclient import DriveClient
+
+
+#fields requested while scanning. Only what's needed to group files and identify the copies
+SCAN_FIELDS = 'id, name, size, md5Checksum, createdTime, ownedByMe'
+
+#only files the user owns count against their quota and are theirs to delete
+SCAN_QUERY = "'me' in owners and trashed = false"
+
+#compact record kept per candidate file: (id, name, createdTime)
+FileRecord = Tuple[str, str, str]
+
+
+class DuplicateFinder:
+    """
+    Finds duplicate uploads in a single streaming pass over the drive listing.
+    Files are grouped by size first and only files sharing a size with another file are grouped by md5Checksum.
+    Memory is one compact record per distinct size plus one per candidate, never the full metadata of every file,
+    so million file drives can be scanned
+    """
+
+    def __init__(self):
+        #size -> first file seen with that size, until a second file of that size shows up
+        self._single: Dict[int, Tuple[str, FileRecord]] = {}
+        #size -> md5Checksum -> records, only for sizes seen at least twice
+        self._candidates: Dict[int, Dict[str, List[FileRecord]]] = {}
+        self.scanned_files = 0
+
+    def add(self, file: Dict[str, Any]) -> None:
+        """
+        Add one file from the listing. Files owned by someone else, files without content checksums (Google Workspace files,
+        folders) and empty files are skipped
+        """
+        self.scanned_files += 1
+        md5 = file.get('md5Checksum')
+        size = int(file.get('size') or 0)
+        if not md5 or size == 0 or not file.get('ownedByMe'):
+            return
+
+        record = (file['id'], file.get('name', ''), file.get('createdTime', ''))
+        groups = self._candidates.get(size)
+        if groups is None:
+            first = self._single.pop(size, None)
+            if first is None:
+                self._single[size] = (md5, record)
+                return
+            #second file of this size, promote the size to a candidate group
+            groups = self._candidates[size] = {first[0]: [first[1]]}
+        groups.setdefault(md5, []).append(record)
+
+    def add_all(self, files: Iterable[Dict[str, Any]]) -> 'DuplicateFinder':
+        for file in files:
+            self.add(file)
+        return self
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Build the duplicate report. In every group the oldest copy is listed first and is the one suggested to keep
+
+        Returns:
+            Dictionary with the duplicate 'groups' sorted by reclaimable bytes, plus scannedFiles, duplicateFiles and reclaimableBytes totals
+        """
+        groups = []
+        for size, by_md5 in self._candidates.items():
+            for md5, records in by_md5.items():
+                if len(records) < 2:
+                    continue
+                records = sorted(records, key=lambda record: record[2])
+                groups.append({
+                    'md5Checksum': md5,
+                    'size': size,
+                    'files': [{'id': file_id, 'name': name, 'createdTime': created} for file_id, name, created in records],
+                    'reclaimableBytes': size * (len(records) - 1),
+                })
+        groups.sort(key=lambda group: group['reclaimableBytes'], reverse=True)
+        return {
+            'groups': groups,
+            'scannedFiles': self.scanned_files,
+            'duplicateFiles': sum(len(group['files']) - 1 for group in groups),
+            'reclaimableBytes': sum(group['reclaimableBytes'] for group in groups),
+        }
+
+
+def find_duplicates(drive_client: DriveClient) -> Dict[str, Any]:
+    """
+    Scan the files the user owns and report duplicates. Files shared with the user and shared drive files are left out,
+    they use someone else's storage and aren't the user's to delete
+
+    Args:
+        drive_client: DriveClient used to stream the listing
+
+    Returns:
+        The DuplicateFinder report
+    """
+    files = drive_client.iter_files(SCAN_FIELDS, q=SCAN_QUERY)
+    return DuplicateFinder().add_all(files).report()
+
+def redundant_file_ids(report: Dict[str, Any]) -> List[str]:
+    """Returns the ids of every copy except the oldest of each duplicate group"""
+    return [file['id'] for group in report['groups'] for file in group['files'][1:]]
+
+def trash_files(drive_client: DriveClient, file_ids: List[str], max_workers: int = 4) -> Dict[str, bool]:
+    """
+    Move the selected duplicates to the trash concurrently, so a wrong selection can still be restored
+
+    Args:
+        drive_client: DriveClient used to trash the files
+        file_ids: IDs of the files to trash
+        max_workers: Maximum number of concurrent requests
+
+    Returns:
+        Mapping of file id to whether it was trashed
+    """
+    def trash(file_id: str) -> bool:
+        try:
+            return drive_client.trash_file(file_id)
+        except Exception as e:
+            print(f"Error trashing file {file_id}: {str(e)}")
+            return False
+
+    if not file_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='drive-trash') as executor:
+        return dict(zip(file_ids, executor.map(trash, file_ids)))
@@ -1,12 +1,30 @@
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
 import io
+import json
+import mimetypes
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 import ntpath
 import os
-from src.interfaces.interface import AuthProvider
-from src.utils.utils import path_leaf
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from src.interfaces.interface import AuthProvider, Tracer
+from src.utils.utils import path_leaf, file_md5
+from src.utils.tracing import NoOpTracer
+from src.drive.cache import ContentCache
+from src.utils.singleflight import SingleFlight
+from src.drive.enrichment import PageEnricher
+from src.utils.lazy import LazyImport
+from src.utils.file_hashes import FileHashCache, HashingReader
+
+#the api client is imported on first use, importing it costs more than the rest of startup
+build = LazyImport('googleapiclient.discovery', 'build')
+build_from_document = LazyImport('googleapiclient.discovery', 'build_from_document')
+MediaFileUpload = LazyImport('googleapiclient.http', 'MediaFileUpload')
+MediaIoBaseUpload = LazyImport('googleapiclient.http', 'MediaIoBaseUpload')
+MediaIoBaseDownload = LazyImport('googleapiclient.http', 'MediaIoBaseDownload')
 
 class DriveClient:
     """
@@ -14,6 +32,9 @@ class DriveClient:
     Handles file operations and service initialization
     """
 
+    #parsed drive discovery document shared by every client once preload() has run
+    _discovery_document: Optional[Dict[str, Any]] = None
+
     #mapping of mime types to extension and description to be utilized by utility funcitons
     GOOGLE_MIME_TYPES = {
         'application/vnd.google-apps.document': {
@@ -33,10 +54,55 @@ class DriveClient:
         },
     }
 
+    #export formats that can be requested by short name. Which ones a file supports is listed in its exportLinks metadata
+    EXPORT_FORMATS = {
+        'pdf': 'application/pdf',
+        'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+        'odt': 'application/vnd.oasis.opendocument.text',
+        'ods': 'application/vnd.oasis.opendocument.spreadsheet',
+        'odp': 'application/vnd.oasis.opendocument.presentation',
+        'rtf': 'application/rtf',
+        'txt': 'text/plain',
+        'csv': 'text/csv',
+        'tsv': 'text/tab-separated-values',
+        'html': 'text/html',
+        'epub': 'application/epub+zip',
+        'png': 'image/png',
+        'jpg': 'image/jpeg',
+        'svg': 'image/svg+xml',
+    }
+
+    #export formats offered in the ui for each Google Workspace type, on top of the default in GOOGLE_MIME_TYPES
+    EXPORT_OPTIONS = {
+        'application/vnd.google-apps.document': ['pdf', 'odt', 'txt'],
+        'application/vnd.google-apps.spreadsheet': ['pdf', 'ods', 'csv'],
+        'application/vnd.google-apps.presentation': ['pdf', 'odp', 'txt'],
+    }
+
     #constant variable representing the mime type value of a folder
     FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
 
 
+    #fields requested for every file in a listing
+    LIST_FILE_FIELDS = 'id, name, mimeType, modifiedTime, capabilities/canEdit, capabilities/canDelete, shared, ownedByMe, parents'
+
+    #size of each media request when streaming file contents
+    DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+    #seconds a folder id to name mapping is reused across paged listing requests
+    FOLDER_MAP_TTL = 60
+
+    #seconds the revisions of the last listing shown to the user are trusted for downloads started from it
+    LISTING_REVISION_TTL = 60
+
+    #fields of same named files compared before a deduplicated upload, also returned by the upload
+    UPLOAD_MATCH_FIELDS = 'id, name, mimeType, size, md5Checksum, modifiedTime'
+
+    #metadata fields requested for a single file. md5Checksum and modifiedTime double as http cache validators
+    FILE_METADATA_FIELDS = 'id, name, mimeType, size, md5Checksum, modifiedTime, exportLinks'
+
     #mapping of mime type to human readable descriptions
     MIME_TYPE_MAPPING = {
         # Google Workspace Types
@@ -95,16 +161,33 @@ class DriveClient:
         'application/sql': 'SQL File'
     }
 
-    def __init__(self, auth_provider: AuthProvider):
+    def __init__(self, auth_provider: AuthProvider, tracer: Optional[Tracer] = None, content_cache: Optional[ContentCache] = None,
+                 hash_cache: Optional[FileHashCache] = None):
         """
         Initialize the drive client with associated Authentication manager
 
         Args:
             auth_provider: AuthProvider interface instance for handling authentication flow
+            tracer: Optional Tracer used to record a span per drive api call. Defaults to a no-op tracer
+            content_cache: Optional ContentCache that downloaded and exported contents are kept in
+            hash_cache: Optional FileHashCache of local file md5s, used by deduplicated uploads
         """
 
         self.auth_provider = auth_provider
-        self._service = None
+        self.tracer = tracer or NoOpTracer()
+        self.content_cache = content_cache
+        self.hash_cache = hash_cache
+        #coalesces identical concurrent api calls (same listing, same file revision) into one request
+        self._single_flight = SingleFlight()
+        #adds display fields to whole listing pages using lookup tables built from the mappings above
+        self._enricher = PageEnricher(self.GOOGLE_MIME_TYPES, self.MIME_TYPE_MAPPING)
+        self._folder_map: Optional[Dict[str, str]] = None
+        self._folder_map_expires = 0.0
+        #file id -> id, mimeType and modifiedTime of the Google Workspace files in the last listing shown to the user
+        self._listing_revisions: Dict[str, Dict[str, Any]] = {}
+        self._listing_revisions_expires = 0.0
+        #api service objects per thread, the underlying httplib2 connection must not be shared between threads
+        self._local = threading.local()
 
     def _get_human_readable_type(self, mime_type: str) -> str:
         """Convert MIME type to human-readable format"""
@@ -117,13 +200,34 @@ class DriveClient:
 
     def _get_service(self):
         """
-        Builds and returns a google api service object which is ultimately utilized by the driveclient to interact with google api
+        Builds and returns a google api service object which is ultimately utilized by the driveclient to interact with google api.
+        Each thread gets its own service object since the http connection underneath isn't thread safe
         """
-        if not self._service:
+        service = getattr(self._local, 'service', None)
+        if service is None:
             credentials = self.auth_provider.get_credentials()
-            self._service = build('drive', 'v3', credentials=credentials)
+            with self.tracer.start_span('drive.build_service'):
+                if self._discovery_document is not None:
+                    service = build_from_document(self._discovery_document, credentials=credentials)
+                else:
+                    service = build('drive', 'v3', credentials=credentials)
+            self._local.service = service
+
+        return service
+
+    @classmethod
+    def preload(cls) -> None:
+        """
+        Load and parse the drive discovery document once so service objects are built from memory.
+        Called in a pre-fork server's master process so every worker shares the parsed document instead of re-reading it
+        """
+        if cls._discovery_document is None:
+            from googleapiclient.discovery_cache import get_static_doc
+            cls._discovery_document = json.loads(get_static_doc('drive', 'v3'))
 
-        return self._service
+    def reset_connections(self) -> None:
+        """Drop the per thread service objects. Used after forking since http connections can't be shared between processes"""
+        self._local = threading.local()
     
     def _get_permission_status(self, file: Dict[str, Any]) -> str:
         """
@@ -153,7 +257,24 @@ class DriveClient:
         }
         return mime_to_ext.get(mime_type, '')
 
-    def list_files(self) -> List[Dict[str, Any]]:
+    def list_files(self, include_shared_drives: bool = False) -> List[Dict[str, Any]]:
+        """
+        Lists all files. Concurrent callers share a single in flight listing
+
+        Args:
+            include_shared_drives: Also list the files of every shared drive the user is a member of
+        """
+        def fetch():
+            files = self._list_files()
+            if include_shared_drives:
+                files.extend(self.list_shared_drive_files())
+            return files
+
+        files, shared = self._single_flight.do(('list_files', include_shared_drives), fetch)
+        #callers decorate the returned file dicts so each caller of a shared listing gets its own copies
+        return [dict(file) for file in files] if shared else files
+
+    def _list_files(self) -> List[Dict[str, Any]]:
         """
         Grabs a google api service object. Sends an api call to get all folders and files listed 
         """
@@ -161,53 +282,353 @@ class DriveClient:
         service = self._get_service()
         
         # get all folders from the api to build a folder mapping
-        folder_results = service.files().list(
-            q=f"mimeType = '{self.FOLDER_MIME_TYPE}'",
-            fields="files(id, name)",
-        ).execute()
+        with self.tracer.start_span('drive.files.list', {'query': 'folders'}) as span:
+            folder_results = service.files().list(
+                q=f"mimeType = '{self.FOLDER_MIME_TYPE}' and trashed = false",
+                fields="files(id, name)",
+            ).execute()
+            span.set_attribute('file_count', len(folder_results.get('files', [])))
         
         #Build the dictionary mapping folder id's to a folder name for all folders returned
         folder_map = {folder['id']: folder['name'] 
                      for folder in folder_results.get('files', [])}
 
         # Then get all non-folder files with their parent information
-        results = service.files().list(
-            q=f"mimeType != '{self.FOLDER_MIME_TYPE}'",  # Exclude folders
-            pageSize=100,
-            fields="files(id, name, mimeType, modifiedTime, capabilities/canEdit, capabilities/canDelete, shared, ownedByMe, parents)",
-        ).execute()
+        with self.tracer.start_span('drive.files.list', {'query': 'files'}) as span:
+            results = service.files().list(
+                q=f"mimeType != '{self.FOLDER_MIME_TYPE}' and trashed = false",  # Exclude folders and the trash like the shared drive listing
+                pageSize=100,
+                fields=f"files({self.LIST_FILE_FIELDS})",
+            ).execute()
+            span.set_attribute('file_count', len(results.get('files', [])))
         
         files = results.get('files', [])
+        return self._enricher.enrich_page(files, folder_map)
+
+    def list_drives(self) -> List[Dict[str, Any]]:
+        """
+        Lists the shared drives the user is a member of
+
+        Returns:
+            List of dicts with the id and name of each shared drive
+        """
+        service = self._get_service()
+        drives = []
+        page_token = None
+        while True:
+            with self.tracer.start_span('drive.drives.list') as span:
+                results = service.drives().list(
+                    pageSize=100,
+                    pageToken=page_token,
+                    fields='nextPageToken, drives(id, name)',
+                ).execute()
+                span.set_attribute('drive_count', len(results.get('drives', [])))
+            drives.extend(results.get('drives', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return drives
+
+    def _list_drive_files(self, drive: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        List every non-folder file of one shared drive. Folders come back in the same query and are only used to resolve folderName,
+        which halves the requests compared to listing folders separately. Runs on worker threads
+        """
+        service = self._get_service()
+        #files at the top of a shared drive have the drive itself as parent
+        folder_map = {drive['id']: drive['name']}
+        files = []
+        page_token = None
+        while True:
+            with self.tracer.start_span('drive.files.list', {'query': 'shared_drive', 'drive.id': drive['id']}) as span:
+                results = service.files().list(
+                    q='trashed = false',
+                    corpora='drive',
+                    driveId=drive['id'],
+                    includeItemsFromAllDrives=True,
+                    supportsAllDrives=True,
+                    pageSize=1000,
+                    pageToken=page_token,
+                    fields=f"nextPageToken, files({self.LIST_FILE_FIELDS}, driveId)",
+                ).execute()
+                span.set_attribute('file_count', len(results.get('files', [])))
+            for item in results.get('files', []):
+                if item.get('mimeType') == self.FOLDER_MIME_TYPE:
+                    folder_map[item['id']] = item['name']
+                else:
+                    item['driveName'] = drive['name']
+                    files.append(item)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        return self._enricher.enrich_page(files, folder_map)
+
+    def list_shared_drive_files(self, max_workers: int = 8) -> List[Dict[str, Any]]:
+        """
+        List the files of every shared drive. Each drive is its own corpus so the drives are listed concurrently on a bounded pool
+
+        Args:
+            max_workers: Maximum number of drives listed at the same time
+
+        Returns:
+            Enriched file dicts of all shared drives, with driveId and driveName set
+        """
+        drives = self.list_drives()
+        if not drives:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(drives)), thread_name_prefix='drive-list') as executor:
+            per_drive = list(executor.map(self._list_drive_files, drives))
+        return [file for files in per_drive for file in files]
+
+    def _get_folder_map(self) -> Dict[str, str]:
+        """
+        Returns a mapping of every folder id to its name, following pagination.
+        The mapping is reused for FOLDER_MAP_TTL seconds so paged api requests don't relist every folder per page
+        """
+        if self._folder_map is not None and time.monotonic() < self._folder_map_expires:
+            return self._folder_map
+
+        def fetch():
+            service = self._get_service()
+            folder_map = {}
+            page_token = None
+            while True:
+                with self.tracer.start_span('drive.files.list', {'query': 'folders'}) as span:
+                    results = service.files().list(
+                        q=f"mimeType = '{self.FOLDER_MIME_TYPE}' and trashed = false",
+                        pageSize=1000,
+                        pageToken=page_token,
+                        fields="nextPageToken, files(id, name)",
+                    ).execute()
+                    span.set_attribute('file_count', len(results.get('files', [])))
+                folder_map.update((folder['id'], folder['name']) for folder in results.get('files', []))
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    return folder_map
+
+        folder_map, _ = self._single_flight.do(('folder_map',), fetch)
+        self._folder_map = folder_map
+        self._folder_map_expires = time.monotonic() + self.FOLDER_MAP_TTL
+        return folder_map
+
+    def invalidate_folder_map(self) -> None:
+        """Forget the cached folder mapping, e.g. after a folder was renamed, so the next lookup relists folders"""
+        self._folder_map_expires = 0.0
+
+    def remember_listing(self, files: List[Dict[str, Any]]) -> None:
+        """
+        Keep the revision of every Google Workspace file of a listing for LISTING_REVISION_TTL seconds.
+        Exports started from that listing take their version from here instead of fetching metadata, so they stay
+        cacheable and conditional without a second round trip. Must be called before timestamps are formatted for display
+        """
+        self._listing_revisions = {
+            file['id']: {'id': file['id'], 'mimeType': file['mimeType'], 'modifiedTime': file['modifiedTime']}
+            for file in files if file.get('mimeType') in self.GOOGLE_MIME_TYPES and file.get('modifiedTime')
+        }
+        self._listing_revisions_expires = time.monotonic() + self.LISTING_REVISION_TTL
+
+    def listing_revision(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Revision of a Google Workspace file from the remembered listing, or None when it isn't in it or has expired"""
+        if time.monotonic() >= self._listing_revisions_expires:
+            return None
+        revision = self._listing_revisions.get(file_id)
+        return dict(revision) if revision else None
+
+    def forget_listing_revision(self, file_id: str) -> None:
+        """Drop a file from the remembered listing, e.g. after it changed or was deleted"""
+        self._listing_revisions.pop(file_id, None)
+
+    def enrich_files(self, files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Add the listing display fields to files fetched outside of list_files (e.g. from the changes feed)"""
+        return self._enricher.enrich_page(files, self._get_folder_map())
+
+    def list_files_page(self, page_token: Optional[str] = None, page_size: int = 100,
+                        folder_map: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Lists a single page of non-folder files
+
+        Args:
+            page_token: Cursor returned by the previous page. None starts from the beginning
+            page_size: Number of files per page, the drive api allows up to 1000
+            folder_map: Optional folder id to name mapping used to resolve folderName. Fetched when not provided
+
+        Returns:
+            Dictionary with the enriched 'files' of the page and 'nextPageToken', which is None on the last page
+        """
+        service = self._get_service()
+        folder_map = folder_map if folder_map is not None else self._get_folder_map()
+
+        with self.tracer.start_span('drive.files.list', {'query': 'files', 'page_size': page_size}) as span:
+            results = service.files().list(
+                q=f"mimeType != '{self.FOLDER_MIME_TYPE}' and trashed = false",
+                pageSize=page_size,
+                pageToken=page_token,
+                fields=f"nextPageToken, files({self.LIST_FILE_FIELDS})",
+            ).execute()
+            span.set_attribute('file_count', len(results.get('files', [])))
+
+        files = self._enricher.enrich_page(results.get('files', []), folder_map)
+        return {'files': files, 'nextPageToken': results.get('nextPageToken')}
+
+    def iter_file_pages(self, page_size: int = 1000, page_token: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields every page of non-folder files as it arrives so callers can process large drives with constant memory
+
+        Args:
+            page_size: Number of files per page
+            page_token: Optional cursor to resume from
+        """
+        folder_map = self._get_folder_map()
+        while True:
+            page = self.list_files_page(page_token, page_size, folder_map)
+            yield page['files']
+            page_token = page['nextPageToken']
+            if not page_token:
+                return
         
-        for file in files:
-            mime_type = file.get('mimeType', '')
-            if mime_type in self.GOOGLE_MIME_TYPES:
-                file['downloadExtension'] = self.GOOGLE_MIME_TYPES[mime_type]['extension']
-            file['humanReadableType'] = self._get_human_readable_type(mime_type)
-            file['canDelete'] = file.get('capabilities', {}).get('canDelete', False)
-            file['canEdit'] = file.get('capabilities', {}).get('canEdit', False)
-            file['permissionStatus'] = self._get_permission_status(file)
-            
-            # Add folder information
-            parents = file.get('parents', [])
-            if parents:
-                file['folderName'] = folder_map.get(parents[0], 'Unknown Folder')
-            else:
-                file['folderName'] = 'N/A'
-            
-        return files
-        
-    def upload_file(self, file_path: str, folder_id: Optional[str] = None) -> Dict[str, Any]:
+    def iter_files(self, fields: str, q: Optional[str] = None, page_size: int = 1000,
+                   include_shared_drives: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Stream raw file metadata one file at a time without enrichment, for whole drive scans that only need a few fields
+
+        Args:
+            fields: Comma separated file fields to request (e.g. 'id, size, md5Checksum')
+            q: Optional drive search query. Defaults to every file that isn't trashed
+            page_size: Number of files per page
+            include_shared_drives: Scan all drives the user can access instead of just my drive
+
+        Yields:
+            File metadata dicts
+        """
+        service = self._get_service()
+        drive_args = {'corpora': 'allDrives', 'includeItemsFromAllDrives': True, 'supportsAllDrives': True} if include_shared_drives else {}
+        page_token = None
+        while True:
+            with self.tracer.start_span('drive.files.list', {'query': 'scan', 'page_size': page_size}) as span:
+                results = service.files().list(
+                    q=q or 'trashed = false',
+                    pageSize=page_size,
+                    pageToken=page_token,
+                    fields=f"nextPageToken, files({fields})",
+                    **drive_args
+                ).execute()
+                span.set_attribute('file_count', len(results.get('files', [])))
+            yield from results.get('files', [])
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return
+
+    def _list_folder_page(self, folder_id: str, page_token: Optional[str], page_size: int,
+                          fields: Optional[str] = None, name: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """List one page of the direct children of a folder, optionally only those with an exact name. Runs on crawler worker threads"""
+        service = self._get_service()
+        q = f"'{folder_id}' in parents and trashed = false"
+        if name is not None:
+            q += f" and name = '{self._escape_query(name)}'"
+        with self.tracer.start_span('drive.files.list', {'query': 'children', 'folder.id': folder_id}) as span:
+            results = service.files().list(
+                q=q,
+                pageSize=page_size,
+                pageToken=page_token,
+                fields=f"nextPageToken, files({fields or self.LIST_FILE_FIELDS})",
+                #shared drive items are left out unless asked for, without these a shared drive folder looks empty
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+            ).execute()
+            span.set_attribute('file_count', len(results.get('files', [])))
+        return results.get('files', []), results.get('nextPageToken')
+
+    @staticmethod
+    def _escape_query(value: str) -> str:
+        """Escape a string literal for a drive search query"""
+        return value.replace('\\', '\\\\').replace("'", "\\'")
+
+    def list_children(self, folder_id: str = 'root', name: Optional[str] = None, fields: Optional[str] = None,
+                      page_size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        List the direct children of a folder
+
+        Args:
+            folder_id: ID of the folder. Defaults to the root of my drive
+            name: Only return children with exactly this name. Drive allows several
+            fields: Comma separated file fields to request. Defaults to LIST_FILE_FIELDS
+            page_size: Number of children requested per page
+
+        Returns:
+            List of file metadata dicts
+        """
+        children = []
+        page_token = None
+        while True:
+            page, page_token = self._list_folder_page(folder_id, page_token, page_size, fields, name)
+            children.extend(page)
+            if not page_token:
+                return children
+
+    def walk(self, folder_id: str = 'root', max_workers: int = 8, page_size: int = 1000,
+             fields: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Crawl a folder subtree and yield every file and folder in it as soon as its page arrives.
+        Folders are listed concurrently on a bounded thread pool, each folder's pages are followed in turn,
+        and items with several parents inside the subtree are only yielded (and descended into) once
+
+        Args:
+            folder_id: ID of the folder to crawl. Defaults to the root of my drive
+            max_workers: Maximum number of concurrent list requests
+            page_size: Number of children requested per page
+            fields: Comma separated file fields to request. Defaults to LIST_FILE_FIELDS, must include id, name and mimeType
+
+        Yields:
+            File metadata dicts with an added 'path' of the containing folder relative to folder_id ('' for direct children)
+        """
+        seen = {folder_id}
+        #folder pages waiting for a worker. Only a bounded number of requests is submitted at a time
+        pending = deque([(folder_id, '', None)])
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='drive-walk') as executor:
+            in_flight = {}
+            while pending or in_flight:
+                while pending and len(in_flight) < max_workers:
+                    parent_id, path, page_token = pending.popleft()
+                    future = executor.submit(self._list_folder_page, parent_id, page_token, page_size, fields)
+                    in_flight[future] = (parent_id, path)
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    parent_id, path = in_flight.pop(future)
+                    children, next_page_token = future.result()
+                    if next_page_token:
+                        #continue this folder before descending so its listing finishes early
+                        pending.appendleft((parent_id, path, next_page_token))
+
+                    for child in children:
+                        if child['id'] in seen:
+                            continue
+                        seen.add(child['id'])
+                        child['path'] = path
+                        if child.get('mimeType') == self.FOLDER_MIME_TYPE:
+                            pending.append((child['id'], f"{path}/{child['name']}" if path else child['name'], None))
+                        yield child
+
+    def upload_file(self, file_path: str, folder_id: Optional[str] = None, dedupe: bool = False) -> Dict[str, Any]:
         """
         Uploads a file frp, local path to Google Drive
 
         Args:
             file_path: Path of file to upload
             folder_id: Optional folder id to upload to. Defaults to none
+            dedupe: Compare with same named files in the folder first. An identical file (same md5Checksum) is skipped,
+                a changed one is updated in place and only otherwise a new file is created
 
         Return:
-            Dictionary that contains uploaded file metadata
+            Dictionary that contains uploaded file metadata. With dedupe it also has an 'uploadAction' of skipped, updated or created
+
+
+        Raises:
+            IOError: With dedupe, if the md5Checksum drive computed doesn't match the content that was read and sent
         """
+        if dedupe:
+            return self._upload_deduplicated(file_path, folder_id)
+
         service = self._get_service()
 
         # Extract just the filename from the path
@@ -223,67 +644,438 @@ class DriveClient:
         media = MediaFileUpload(file_path, resumable=True)
 
         #initiate upload of file
-        file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id, name, mimeType, modifiedTime'
-        ).execute()
+        with self.tracer.start_span('drive.files.create', {'file.name': filename}) as span:
+            file = service.files().create(
+                body=file_metadata,
+                media_body=media,
+                supportsAllDrives=True,
+                fields='id, name, mimeType, modifiedTime'
+            ).execute()
+            span.set_attribute('file.id', file.get('id'))
 
         return file
-    
 
-    def download_file(self, file_id: str, destination_path: str) -> tuple[bool, str]:
-        """Downloads a file from Google Drive"""
+    def local_md5(self, file_path: str) -> str:
+        """md5 of a local file, comparable to md5Checksum. Read from the hash cache when the file is unchanged"""
+        if self.hash_cache is not None:
+            return self.hash_cache.md5(file_path)
+        return file_md5(file_path)
+
+    def _upload_deduplicated(self, file_path: str, folder_id: Optional[str]) -> Dict[str, Any]:
+        """
+        Upload a file unless an identical copy already exists under the same name in the folder.
+        The local file is only read up front when a same named drive file has the same size, otherwise the sizes already
+        prove it changed and the file is hashed while it uploads
+        """
+        filename = path_leaf(file_path)
+        size = os.path.getsize(file_path)
+        #workspace files have no md5Checksum and can't take binary content, they are never matched
+        existing = [file for file in self.list_children(folder_id or 'root', name=filename, fields=self.UPLOAD_MATCH_FIELDS)
+                    if file.get('md5Checksum')]
+
+        if any(int(file.get('size') or -1) == size for file in existing):
+            local_md5 = self.local_md5(file_path)
+            for file in existing:
+                if file['md5Checksum'] == local_md5:
+                    return dict(file, uploadAction='skipped')
+
+        if existing:
+            #several same named files can exist, the most recently modified one is updated
+            target = max(existing, key=lambda file: file.get('modifiedTime', ''))
+            return dict(self._upload_media(file_path, file_id=target['id']), uploadAction='updated')
+        return dict(self._upload_media(file_path, folder_id=folder_id), uploadAction='created')
+
+    def _upload_media(self, file_path: str, file_id: Optional[str] = None, folder_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Create a new file, or update file_id in place, hashing the content as it is sent.
+        The hash is checked against the md5Checksum drive computed and recorded in the hash cache for the next upload
+
+        Raises:
+            IOError: If drive's md5Checksum differs from the local hash, e.g. because the file changed while uploading
+        """
         service = self._get_service()
-        
+        filename = path_leaf(file_path)
+        stat = os.stat(file_path)
+        reader = HashingReader(file_path)
         try:
-            # Get file metadata first
-            file_metadata = service.files().get(
-                fileId=file_id,
-                fields='id, name, mimeType'
+            media = MediaIoBaseUpload(reader, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream', resumable=True)
+            if file_id:
+                with self.tracer.start_span('drive.files.update', {'file.id': file_id}):
+                    file = service.files().update(
+                        fileId=file_id,
+                        media_body=media,
+                        supportsAllDrives=True,
+                        fields=self.UPLOAD_MATCH_FIELDS
+                    ).execute()
+                if self.content_cache is not None:
+                    self.content_cache.invalidate(file_id)
+            else:
+                with self.tracer.start_span('drive.files.create', {'file.name': filename}) as span:
+                    file = service.files().create(
+                        body={'name': filename, 'parents': [folder_id] if folder_id else []},
+                        media_body=media,
+                        supportsAllDrives=True,
+                        fields=self.UPLOAD_MATCH_FIELDS
+                    ).execute()
+                    span.set_attribute('file.id', file.get('id'))
+        finally:
+            reader.close()
+
+        local_md5 = reader.hexdigest()
+        if local_md5 and file.get('md5Checksum') and local_md5 != file['md5Checksum']:
+            raise IOError(f"{filename} changed while uploading, drive md5 {file['md5Checksum']} differs from the local {local_md5}. "
+                          f"The drive copy ({file.get('id')}) may not match the local file")
+        elif local_md5 and self.hash_cache is not None:
+            self.hash_cache.put(file_path, local_md5, (stat.st_size, stat.st_mtime_ns))
+        return file
+
+    def update_file(self, file_id: str, file_path: str) -> Dict[str, Any]:
+        """
+        Replace the content of an existing drive file with a local file, keeping its id, sharing and history
+
+        Args:
+            file_id: ID of the file to update
+            file_path: Path of the local file with the new content
+
+        Returns:
+            Dictionary that contains the updated file metadata
+        """
+        return self._upload_media(file_path, file_id=file_id)
+
+    def create_folder(self, name: str, parent_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Create a folder
+
+        Args:
+            name: Name of the folder
+            parent_id: Optional id of the parent folder. Defaults to the root of my drive
+
+        Returns:
+            Dictionary that contains the created folder metadata
+        """
+        service = self._get_service()
+        with self.tracer.start_span('drive.files.create', {'file.name': name, 'folder': True}) as span:
+            folder = service.files().create(
+                body={'name': name, 'mimeType': self.FOLDER_MIME_TYPE, 'parents': [parent_id] if parent_id else []},
+                supportsAllDrives=True,
+                fields='id, name, mimeType, modifiedTime'
             ).execute()
-            
-            mime_type = file_metadata.get('mimeType', '')
-            
-            # Handle Google Workspace files
-            if mime_type in self.GOOGLE_MIME_TYPES:
-                export_mime_type = self.GOOGLE_MIME_TYPES[mime_type]['mime_type']
-                request = service.files().export_media(
+            span.set_attribute('file.id', folder.get('id'))
+        return folder
+
+    def get_file_metadata(self, file_id: str) -> Dict[str, Any]:
+        """
+        Fetch the metadata of a single file
+
+        Args:
+            file_id: ID of the file
+
+        Returns:
+            Dictionary containing the fields listed in FILE_METADATA_FIELDS
+        """
+        service = self._get_service()
+
+        def fetch():
+            with self.tracer.start_span('drive.files.get', {'file.id': file_id}):
+                return service.files().get(
                     fileId=file_id,
-                    mimeType=export_mime_type
-                )
-            else:
-                # Handle binary files
-                request = service.files().get_media(fileId=file_id)
-            
+                    supportsAllDrives=True,
+                    fields=self.FILE_METADATA_FIELDS
+                ).execute()
+
+        metadata, shared = self._single_flight.do(('metadata', file_id), fetch)
+        return dict(metadata) if shared else metadata
+
+    def get_change_token(self) -> str:
+        """
+        Returns the current start page token of the drive changes feed. The token advances whenever anything in the drive changes
+        which makes it a cheap validator for the file listing
+        """
+        service = self._get_service()
+
+        def fetch():
+            with self.tracer.start_span('drive.changes.getStartPageToken'):
+                return service.changes().getStartPageToken().execute()['startPageToken']
+
+        token, _ = self._single_flight.do(('change_token',), fetch)
+        return token
+
+    def list_changes(self, page_token: str, include_shared_drives: bool = False) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        List everything that changed since a change token, following pagination
+
+        Args:
+            page_token: Change token from get_change_token or a previous call
+            include_shared_drives: Also report changes in shared drives
+
+        Returns:
+            Tuple of (changes, token to continue from). Each change has the fileId, whether it was removed and
+            the file's LIST_FILE_FIELDS and trashed flag when it still exists
+        """
+        service = self._get_service()
+        drive_args = {'includeItemsFromAllDrives': True, 'supportsAllDrives': True} if include_shared_drives else {}
+        changes = []
+        while True:
+            with self.tracer.start_span('drive.changes.list') as span:
+                results = service.changes().list(
+                    pageToken=page_token,
+                    pageSize=1000,
+                    fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({self.LIST_FILE_FIELDS}, trashed))",
+                    **drive_args
+                ).execute()
+                span.set_attribute('change_count', len(results.get('changes', [])))
+            changes.extend(results.get('changes', []))
+            if 'newStartPageToken' in results:
+                return changes, results['newStartPageToken']
+            page_token = results['nextPageToken']
+
+    def watch_changes(self, page_token: str, address: str, channel_id: str, token: str,
+                      expiration: Optional[float] = None, include_shared_drives: bool = False) -> Dict[str, Any]:
+        """
+        Open a notification channel that pings a webhook whenever something changes after page_token
+
+        Args:
+            page_token: Change token the channel starts watching from
+            address: Https url of the webhook
+            channel_id: Unique id of the new channel
+            token: Secret the webhook receives back in the X-Goog-Channel-Token header
+            expiration: Requested expiry as a unix timestamp in seconds. Drive caps it and reports the actual one
+            include_shared_drives: Also watch changes in shared drives
+
+        Returns:
+            The channel, including its resourceId and expiration (milliseconds)
+        """
+        service = self._get_service()
+        body = {'id': channel_id, 'type': 'web_hook', 'address': address, 'token': token}
+        if expiration:
+            body['expiration'] = int(expiration * 1000)
+        drive_args = {'includeItemsFromAllDrives': True, 'supportsAllDrives': True} if include_shared_drives else {}
+        with self.tracer.start_span('drive.changes.watch', {'channel.id': channel_id}):
+            return service.changes().watch(pageToken=page_token, body=body, **drive_args).execute()
+
+    def stop_channel(self, channel_id: str, resource_id: str) -> None:
+        """Stop a notification channel opened with watch_changes"""
+        service = self._get_service()
+        with self.tracer.start_span('drive.channels.stop', {'channel.id': channel_id}):
+            service.channels().stop(body={'id': channel_id, 'resourceId': resource_id}).execute()
+
+    def _export_mime_type(self, file_metadata: Dict[str, Any], export_format: Optional[str] = None) -> Optional[str]:
+        """
+        Returns the mime type a Google Workspace file is exported as, or None for binary files
+
+        Args:
+            file_metadata: Metadata of the file. When it carries exportLinks the requested format is checked against them
+            export_format: Optional short name from EXPORT_FORMATS or a full mime type. Defaults to the format in GOOGLE_MIME_TYPES
+
+        Raises:
+            ValueError: If the format is unknown or the file can't be exported to it
+        """
+        mime_type = file_metadata.get('mimeType', '')
+        export_links = file_metadata.get('exportLinks')
+        if not export_format:
+            if mime_type in self.GOOGLE_MIME_TYPES:
+                return self.GOOGLE_MIME_TYPES[mime_type]['mime_type']
+            return None
+
+        if mime_type not in self.GOOGLE_MIME_TYPES and not export_links:
+            raise ValueError(f"Only Google Workspace files can be exported, not {mime_type}")
+        export_mime_type = self.EXPORT_FORMATS.get(export_format.lower(), export_format)
+        if '/' not in export_mime_type:
+            raise ValueError(f"Unknown export format: {export_format}")
+        if export_links is not None and export_mime_type not in export_links:
+            raise ValueError(f"{self._get_human_readable_type(mime_type)} can't be exported as {export_format}")
+        return export_mime_type
+
+    def _fetch_media(self, file_id: str, file_metadata: Dict[str, Any], destination_path: str, export_mime_type: Optional[str] = None) -> None:
+        """
+        Download or export the content of a file to a local path. Errors propagate to the caller.
+        Concurrent fetches of the same file revision share one download
+
+        Args:
+            file_id: ID of file to download
+            file_metadata: Metadata of the file, only the mimeType is required
+            destination_path: Local path the file is written to
+            export_mime_type: Mime type Google Workspace files are exported as, None for binary files
+        """
+        revision_key = ContentCache.make_key(file_id, file_metadata, export_mime_type)
+        if revision_key:
+            content, _ = self._single_flight.do(
+                ('media', revision_key),
+                lambda: self._download_content(file_id, file_metadata, export_mime_type)
+            )
+        else:
+            #without a revision two requests may not be asking for the same bytes
+            content = self._download_content(file_id, file_metadata, export_mime_type)
+        
+        # Ensure the directory exists
+        os.makedirs(os.path.dirname(destination_path) or '.', exist_ok=True)
+        
+        #dump the content to destination
+        with self.tracer.start_span('download.write', {'path': destination_path}):
+            with open(destination_path, 'wb') as f:
+                f.write(content)
+
+    def _media_request(self, file_id: str, export_mime_type: Optional[str] = None):
+        """Build the api request that returns a file's content, exporting Google Workspace files"""
+        service = self._get_service()
+        
+        # Handle Google Workspace files
+        if export_mime_type:
+            return service.files().export_media(
+                fileId=file_id,
+                mimeType=export_mime_type
+            )
+        # Handle binary files
+        return service.files().get_media(fileId=file_id, supportsAllDrives=True)
+
+    def _download_content(self, file_id: str, file_metadata: Dict[str, Any], export_mime_type: Optional[str] = None) -> bytes:
+        """Download or export the content of a file into memory"""
+        mime_type = file_metadata.get('mimeType', '')
+        request = self._media_request(file_id, export_mime_type)
+        
+        attributes = {
+            'file.id': file_id,
+            'file.mime_type': mime_type,
+            'file.size': file_metadata.get('size'),
+            'export': export_mime_type
+        }
+        with self.tracer.start_span('drive.download', attributes) as download_span:
             #set up byte stream
             fh = io.BytesIO()
             #pass bytestream and request to download request
             downloader = MediaIoBaseDownload(fh, request)
             
             done = False
+            chunk_count = 0
             #keep downloading until all of the file is done
             while not done:
-                status, done = downloader.next_chunk()
+                with self.tracer.start_span('drive.media.chunk', {'chunk.index': chunk_count}) as chunk_span:
+                    status, done = downloader.next_chunk()
+                    chunk_span.set_attribute('bytes_downloaded', fh.tell())
+                chunk_count += 1
+            download_span.set_attribute('chunk_count', chunk_count)
+            download_span.set_attribute('bytes', fh.tell())
             
-            #move pointer to beginning of byte stream
-            fh.seek(0)
-            
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(destination_path) or '.', exist_ok=True)
-            
-            #dump the stream to destination
-            with open(destination_path, 'wb') as f:
-                f.write(fh.getvalue())
-                
+            content = fh.getvalue()
             #close stream
             fh.close()
+        return content
+
+    def iter_content(self, file_id: str, metadata: Optional[Dict[str, Any]] = None, export_format: Optional[str] = None,
+                     chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Stream the content of a file chunk by chunk without holding the whole file in memory or on disk.
+        Read from the content cache when the revision is already cached
+
+        Args:
+            file_id: ID of file to download
+            metadata: Optional metadata already fetched by the caller. Skips the metadata round trip when provided
+            export_format: Optional export format for Google Workspace files, see _export_mime_type
+            chunk_size: Size of each requested media chunk in bytes
+
+        Yields:
+            Chunks of the file content
+        """
+        file_metadata = metadata if metadata is not None else self.get_file_metadata(file_id)
+        export_mime_type = self._export_mime_type(file_metadata, export_format)
+
+        key = self.content_cache.make_key(file_id, file_metadata, export_mime_type) if self.content_cache is not None else None
+        cached_path = self.content_cache.get(key) if key else None
+        if cached_path:
+            with open(cached_path, 'rb') as f:
+                yield from iter(lambda: f.read(chunk_size), b'')
+            return
+
+        fh = io.BytesIO()
+        downloader = MediaIoBaseDownload(fh, self._media_request(file_id, export_mime_type), chunksize=chunk_size)
+        done = False
+        chunk_count = 0
+        while not done:
+            with self.tracer.start_span('drive.media.chunk', {'file.id': file_id, 'chunk.index': chunk_count}):
+                status, done = downloader.next_chunk()
+            chunk_count += 1
+            #hand the chunk over and reuse the buffer so at most one chunk is held at a time
+            yield fh.getvalue()
+            fh.seek(0)
+            fh.truncate()
+
+    def get_cached_path(self, file_id: str, metadata: Optional[Dict[str, Any]] = None, export_format: Optional[str] = None) -> Optional[str]:
+        """
+        Returns the local path of a file's content in the content cache, downloading it on a miss.
+        Callers can serve the returned path directly instead of copying it
+
+        Args:
+            file_id: ID of file to download
+            metadata: Optional metadata already fetched by the caller. Skips the metadata round trip when provided
+            export_format: Optional export format for Google Workspace files, see _export_mime_type
+
+        Returns:
+            Path inside the cache, or None if no cache is configured or the file has no version to key it by
+        """
+        if self.content_cache is None:
+            return None
+        file_metadata = metadata if metadata is not None else self.get_file_metadata(file_id)
+        export_mime_type = self._export_mime_type(file_metadata, export_format)
+        key = self.content_cache.make_key(file_id, file_metadata, export_mime_type)
+        if key is None:
+            return None
+        with self.tracer.start_span('cache.get_or_fetch', {'file.id': file_id}):
+            return self.content_cache.get_or_fetch(
+                key,
+                lambda temp_path: self._fetch_media(file_id, file_metadata, temp_path, export_mime_type)
+            )
+
+    def download_file(self, file_id: str, destination_path: str, metadata: Optional[Dict[str, Any]] = None,
+                      export_format: Optional[str] = None, raise_errors: bool = False) -> bool:
+        """
+        Downloads a file from Google Drive. Served from the content cache when one is configured
+
+        Args:
+            file_id: ID of file to download
+            destination_path: Local path the file is written to
+            metadata: Optional metadata already fetched by the caller. Skips the metadata round trip when provided
+            export_format: Optional export format for Google Workspace files (e.g. 'pdf', 'csv' or a mime type)
+            raise_errors: Raise errors to the caller instead of printing them and returning False
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            # Get file metadata first unless the caller already has it
+            file_metadata = metadata if metadata is not None else self.get_file_metadata(file_id)
+
+            cached_path = self.get_cached_path(file_id, file_metadata, export_format)
+            if cached_path:
+                os.makedirs(os.path.dirname(destination_path) or '.', exist_ok=True)
+                shutil.copyfile(cached_path, destination_path)
+            else:
+                self._fetch_media(file_id, file_metadata, destination_path, self._export_mime_type(file_metadata, export_format))
             return True
             
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"Error downloading file: {str(e)}")
             return False            
 
+    def trash_file(self, file_id: str) -> bool:
+        """
+        Move a file to the trash. Unlike delete_file it can be restored from drive for 30 days
+
+        Args:
+            file_id: ID of file to trash
+
+        Returns:
+            True if successful. Errors propagate to the caller
+        """
+        service = self._get_service()
+        with self.tracer.start_span('drive.files.update', {'file.id': file_id, 'trashed': True}):
+            service.files().update(fileId=file_id, body={'trashed': True}, supportsAllDrives=True, fields='id').execute()
+        if self.content_cache is not None:
+            self.content_cache.invalidate(file_id)
+        self.forget_listing_revision(file_id)
+        return True
+
     def delete_file(self, file_id: str) -> bool:
         """
         Delete a file from Google Drive
@@ -295,6 +1087,8 @@ class DriveClient:
             True if successful, False otherwise
         """
         service = self._get_service()
-        service.files().delete(fileId=file_id).execute()
+        with self.tracer.start_span('drive.files.delete', {'file.id': file_id}):
+            service.files().delete(fileId=file_id, supportsAllDrives=True).execute()
+        self.forget_listing_revision(file_id)
         return True
     
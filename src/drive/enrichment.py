@@ -0,0 +1,95 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+
+#permission status for every combination of (ownedByMe, shared, canEdit). Same rules as DriveClient._get_permission_status
+PERMISSION_TABLE = {
+    (owned, shared, can_edit): 'Owner' if owned else ('Editor' if can_edit else 'Viewer') if shared else 'Limited Access'
+    for owned in (False, True)
+    for shared in (False, True)
+    for can_edit in (False, True)
+}
+
+DISPLAY_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class PageEnricher:
+    """
+    Adds the display fields (type description, download extension, permissions, folder name) to a whole page of listed files at once.
+    Each field is computed as a column over the page from precomputed lookup tables instead of running the per file helper
+    methods for every row, which removes most of the interpreter overhead on large listings
+    """
+
+    def __init__(self, google_mime_types: Dict[str, Dict[str, str]], mime_type_mapping: Dict[str, str]):
+        """
+        Args:
+            google_mime_types: Google Workspace mime type to export info mapping (DriveClient.GOOGLE_MIME_TYPES)
+            mime_type_mapping: Mime type to description mapping (DriveClient.MIME_TYPE_MAPPING)
+        """
+        #mime type -> (humanReadableType, downloadExtension). Unknown mime types are added on first sight
+        self._mime_table: Dict[str, Tuple[str, Optional[str]]] = {
+            mime_type: (description, None) for mime_type, description in mime_type_mapping.items()
+        }
+        for mime_type, info in google_mime_types.items():
+            self._mime_table[mime_type] = (info['description'], info['extension'])
+
+    def _mime_info(self, mime_type: str) -> Tuple[str, Optional[str]]:
+        info = self._mime_table.get(mime_type)
+        if info is None:
+            info = self._mime_table[mime_type] = (mime_type, None)
+        return info
+
+    def enrich_page(self, files: List[Dict[str, Any]], folder_map: Dict[str, str]) -> List[Dict[str, Any]]:
+        """
+        Enrich a page of files in place
+
+        Args:
+            files: File dicts as returned by files().list
+            folder_map: Folder id to name mapping used to resolve folderName
+
+        Returns:
+            The same list, for chaining
+        """
+        if not files:
+            return files
+
+        #gather the input columns
+        capabilities = [file.get('capabilities') or {} for file in files]
+        can_edit = [caps.get('canEdit', False) for caps in capabilities]
+        can_delete = [caps.get('canDelete', False) for caps in capabilities]
+        mime_info = list(map(self._mime_info, [file.get('mimeType', '') for file in files]))
+        permissions = [
+            PERMISSION_TABLE[(bool(file.get('ownedByMe', False)), bool(file.get('shared', False)), bool(edit))]
+            for file, edit in zip(files, can_edit)
+        ]
+        folder_names = [
+            folder_map.get(parents[0], 'Unknown Folder') if parents else 'N/A'
+            for parents in (file.get('parents') for file in files)
+        ]
+
+        #write the output columns back to the rows
+        for file, (description, extension), edit, delete, permission, folder_name in zip(
+                files, mime_info, can_edit, can_delete, permissions, folder_names):
+            if extension is not None:
+                file['downloadExtension'] = extension
+            file['humanReadableType'] = description
+            file['canDelete'] = delete
+            file['canEdit'] = edit
+            file['permissionStatus'] = permission
+            file['folderName'] = folder_name
+        return files
+
+
+@lru_cache(maxsize=65536)
+def format_timestamp(value: str, fmt: str = DISPLAY_TIME_FORMAT) -> str:
+    """Format a drive RFC 3339 timestamp for display. Cached since listings repeat timestamps (bulk uploads, shared edits)"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).strftime(fmt)
+
+def format_timestamps(files: List[Dict[str, Any]], key: str = 'modifiedTime', fmt: str = DISPLAY_TIME_FORMAT) -> List[Dict[str, Any]]:
+    """Replace the timestamp under key with its display format for a whole page, parsing each unique timestamp once"""
+    for file in files:
+        value = file.get(key)
+        if value:
+            file[key] = format_timestamp(value, fmt)
+    return files
@@ -0,0 +1,184 @@
+import heapq
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from src.drive.driveclient import DriveClient
+
+
+#fields requested while scanning. quotaBytesUsed includes stored revisions, size is the fallback
+USAGE_FIELDS = 'id, name, mimeType, size, quotaBytesUsed, parents, ownedByMe, driveId'
+
+#whole drive scans only count the user's own files, files shared with them use someone else's quota
+OWNED_QUERY = "'me' in owners and trashed = false"
+
+DEFAULT_TOP_N = 20
+
+
+class UsageAnalyzer:
+    """
+    Adds up storage usage in a single streaming pass over the drive listing.
+    Only folders are remembered (name, parent and the bytes of the files directly inside), files are folded into their
+    folder's totals, a fixed size heap of the largest files and per mime type totals as they stream past.
+    Memory is proportional to the number of folders rather than files, and folder totals are summed bottom-up once at the end
+    """
+
+    def __init__(self, top_n: int = DEFAULT_TOP_N):
+        """
+        Args:
+            top_n: Number of largest files kept for the report. 0 or less keeps none
+        """
+        self.top_n = top_n
+        #folder id -> [name, parent id]
+        self._folders: Dict[str, List[Optional[str]]] = {}
+        #folder id (or parent id outside the scan) -> [bytes, file count] of the files directly inside
+        self._direct: Dict[str, List[int]] = {}
+        #mime type -> [bytes, file count]
+        self._mime_types: Dict[str, List[int]] = {}
+        #min heap of the largest files: (bytes, id, name, parent id, mime type)
+        self._largest: List[Tuple[int, str, str, Optional[str], str]] = []
+        self.total_bytes = 0
+        self.file_count = 0
+
+    @staticmethod
+    def file_bytes(file: Dict[str, Any]) -> int:
+        """Storage a file uses. Google Workspace files report no size and use no quota"""
+        return int(file.get('quotaBytesUsed') or file.get('size') or 0)
+
+    def add(self, file: Dict[str, Any]) -> None:
+        """Add one file or folder from the listing. Files with several parents are counted once, under the first"""
+        parents = file.get('parents')
+        parent = parents[0] if parents else None
+        mime_type = file.get('mimeType', '')
+        if mime_type == DriveClient.FOLDER_MIME_TYPE:
+            self._folders[file['id']] = [file.get('name', ''), parent]
+            return
+
+        size = self.file_bytes(file)
+        self.total_bytes += size
+        self.file_count += 1
+        direct = self._direct.get(parent)
+        if direct is None:
+            direct = self._direct[parent] = [0, 0]
+        direct[0] += size
+        direct[1] += 1
+        by_mime = self._mime_types.get(mime_type)
+        if by_mime is None:
+            by_mime = self._mime_types[mime_type] = [0, 0]
+        by_mime[0] += size
+        by_mime[1] += 1
+
+        if self.top_n <= 0:
+            return
+        entry = (size, file['id'], file.get('name', ''), parent, mime_type)
+        if len(self._largest) < self.top_n:
+            heapq.heappush(self._largest, entry)
+        elif size > self._largest[0][0]:
+            heapq.heapreplace(self._largest, entry)
+
+    def add_all(self, files: Iterable[Dict[str, Any]]) -> 'UsageAnalyzer':
+        for file in files:
+            self.add(file)
+        return self
+
+    def _folder_totals(self) -> Dict[str, List[int]]:
+        """
+        Totals of every folder including its subfolders. Folders are ordered deepest first so each one is complete
+        before it is added to its parent, which sums the whole tree in one pass over the folders
+        """
+        depths: Dict[str, int] = {}
+        for folder_id in self._folders:
+            #walk up until a folder of known depth, then fill in the depths on the way back down
+            chain = []
+            current = folder_id
+            while current in self._folders and current not in depths and current not in chain:
+                chain.append(current)
+                current = self._folders[current][1]
+            depth = depths.get(current, -1)
+            for folder in reversed(chain):
+                depth += 1
+                depths[folder] = depth
+
+        totals = {folder_id: list(self._direct.get(folder_id, (0, 0))) for folder_id in self._folders}
+        for folder_id in sorted(self._folders, key=depths.__getitem__, reverse=True):
+            parent = self._folders[folder_id][1]
+            if parent in totals:
+                totals[parent][0] += totals[folder_id][0]
+                totals[parent][1] += totals[folder_id][1]
+        return totals
+
+    def _path(self, folder_id: Optional[str]) -> str:
+        """Path of a folder below the top of the scan. Parents outside the scan (the drive root) end the path"""
+        names = []
+        seen = set()
+        while folder_id in self._folders and folder_id not in seen:
+            seen.add(folder_id)
+            name, folder_id = self._folders[folder_id]
+            names.append(name)
+        return '/'.join(reversed(names))
+
+    def report(self, top_n: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Build the usage report
+
+        Args:
+            top_n: Number of folders and mime types listed. Defaults to the top_n given at construction
+
+        Returns:
+            Dictionary with totalBytes, fileCount and folderCount, the top level 'children' of the scan (folders with their
+            totals plus the files directly at the top), and the largest folders ('topFolders'), files ('topFiles') and mime types ('mimeTypes')
+        """
+        top_n = top_n or self.top_n
+        totals = self._folder_totals()
+
+        def folder_entry(folder_id: str) -> Dict[str, Any]:
+            size, count = totals[folder_id]
+            return {'id': folder_id, 'name': self._folders[folder_id][0], 'path': self._path(folder_id), 'bytes': size, 'fileCount': count}
+
+        top_level = [folder_id for folder_id, (_, parent) in self._folders.items() if parent not in self._folders]
+        children = sorted((folder_entry(folder_id) for folder_id in top_level), key=lambda entry: entry['bytes'], reverse=True)
+        #files directly at the top of the scan have parents that aren't scanned folders (the drive root)
+        loose_bytes = sum(size for parent, (size, _) in self._direct.items() if parent not in self._folders)
+        loose_count = sum(count for parent, (_, count) in self._direct.items() if parent not in self._folders)
+
+        largest_folders = heapq.nlargest(top_n, totals, key=lambda folder_id: totals[folder_id][0])
+        return {
+            'totalBytes': self.total_bytes,
+            'fileCount': self.file_count,
+            'folderCount': len(self._folders),
+            'children': children,
+            'looseFiles': {'bytes': loose_bytes, 'fileCount': loose_count},
+            'topFolders': [folder_entry(folder_id) for folder_id in largest_folders],
+            'topFiles': [
+                {'id': file_id, 'name': name, 'path': '/'.join(filter(None, (self._path(parent), name))), 'mimeType': mime_type, 'bytes': size}
+                for size, file_id, name, parent, mime_type in sorted(self._largest, reverse=True)
+            ],
+            'mimeTypes': [
+                {'mimeType': mime_type, 'bytes': size, 'fileCount': count}
+                for mime_type, (size, count) in heapq.nlargest(top_n, self._mime_types.items(), key=lambda item: item[1][0])
+            ],
+        }
+
+
+def analyze_usage(drive_client: DriveClient, folder_id: Optional[str] = None, include_shared_drives: bool = False,
+                  top_n: int = DEFAULT_TOP_N) -> Dict[str, Any]:
+    """
+    Scan storage usage of the whole drive, or of one folder subtree
+
+    Args:
+        drive_client: DriveClient used to stream the listing
+        folder_id: Only scan this folder's subtree (crawled with walk). Defaults to the whole drive in one flat listing
+        include_shared_drives: Also scan shared drives when scanning the whole drive. Shared drive files count against
+            the drive's storage rather than an owner's and are included, other files shared with the user are not
+        top_n: Number of largest folders, files and mime types reported
+
+    Returns:
+        The UsageAnalyzer report
+    """
+    if folder_id:
+        files = drive_client.walk(folder_id, fields=USAGE_FIELDS)
+    else:
+        if include_shared_drives:
+            #shared drive files have no owner to query by, so ownership is checked as the files stream past
+            files = (file for file in drive_client.iter_files(USAGE_FIELDS, include_shared_drives=True)
+                     if file.get('ownedByMe') or file.get('driveId'))
+        else:
+            files = drive_client.iter_files(USAGE_FIELDS, q=OWNED_QUERY)
+    return UsageAnalyzer(top_n).add_all(files).report()
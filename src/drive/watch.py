@@ -0,0 +1,335 @@
+import atexit
+import hmac
+import os
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from src.drive.driveclient import DriveClient
+
+try:
+    import fcntl
+except ImportError:
+    #windows: no advisory locks, every process opens its own channel
+    fcntl = None
+
+
+#headers drive sends with every push notification
+CHANNEL_ID_HEADER = 'X-Goog-Channel-ID'
+CHANNEL_TOKEN_HEADER = 'X-Goog-Channel-Token'
+RESOURCE_STATE_HEADER = 'X-Goog-Resource-State'
+RESOURCE_ID_HEADER = 'X-Goog-Resource-ID'
+MESSAGE_NUMBER_HEADER = 'X-Goog-Message-Number'
+
+
+class ChangeWatcher:
+    """
+    Keeps a snapshot of the file listing fresh from drive push notifications instead of relisting on every request.
+    A changes().watch channel pings the webhook whenever something changes. Each ping marks the snapshot dirty and
+    applies the changes feed since the last change token in the background: changed files are re-enriched and replaced,
+    removed files dropped and their cached contents invalidated. Channels are renewed before they expire.
+
+    Pings are only hints. State is per process and under a pre-fork server a ping reaches a single worker, so every
+    access compares the snapshot's change token with the current one (one getStartPageToken call) and applies the
+    changes feed when it moved. A worker that missed a ping never serves a stale snapshot, the ping just lets the
+    worker that got it catch up ahead of the next request.
+
+    With a lock file only the process holding an exclusive lock on it opens the channel, so a pre-fork server registers
+    one channel per deployment instead of one per worker. When that worker exits the lock is released and the next
+    worker to serve a listing takes the channel over
+    """
+
+    #channels are replaced this many seconds before they expire
+    RENEW_MARGIN = 600
+    #seconds to wait before trying to open a channel again after drive refused one
+    RETRY_INTERVAL = 300
+
+    def __init__(self, drive_client: DriveClient, address: str, token: str, ttl: int = 24 * 60 * 60,
+                 include_shared_drives: bool = False, local: bool = False, poll_interval: float = 30,
+                 lock_file: Optional[str] = None):
+        """
+        Args:
+            drive_client: DriveClient used to list files and read the changes feed
+            address: Https url of the webhook notifications are posted to
+            token: Secret that authenticates notifications
+            ttl: Requested channel lifetime in seconds
+            include_shared_drives: Whether the listing (and the watched changes) include shared drives
+            local: Use a LocalNotifier polling for changes instead of registering a channel with google
+            poll_interval: Seconds between polls of the LocalNotifier
+            lock_file: Optional path of a lock file shared by the worker processes. Only its holder opens a channel
+        """
+        self.drive_client = drive_client
+        self.address = address
+        self.token = token
+        self.ttl = ttl
+        self.include_shared_drives = include_shared_drives
+        self.local = local
+        self.poll_interval = poll_interval
+        self.lock_file = lock_file
+        #open lock file while this process owns the channel
+        self._lock_handle = None
+        self._lock = threading.RLock()
+        self._files: Optional[List[Dict[str, Any]]] = None
+        self._page_token: Optional[str] = None
+        self._dirty = False
+        self._refresh_queued = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+        #active channel: id, resourceId and expiration as a unix timestamp
+        self._channel: Optional[Dict[str, Any]] = None
+        self._channel_retry_at = 0.0
+        self._notifier: Optional[LocalNotifier] = None
+        atexit.register(self.stop)
+
+    @property
+    def page_token(self) -> Optional[str]:
+        """Change token the snapshot is current to. Checked against drive by list_files, so usable as a listing validator after it"""
+        return self._page_token
+
+    def verify(self, token: Optional[str]) -> bool:
+        """Check the token of an incoming notification"""
+        return bool(token) and hmac.compare_digest(token, self.token)
+
+    def list_files(self) -> List[Dict[str, Any]]:
+        """
+        Returns the file listing from the snapshot, loading it on first use and applying pending changes first
+
+        Returns:
+            Copies of the listed files, as returned by DriveClient.list_files
+        """
+        #the token is taken before listing so changes made while listing are applied, not missed
+        current_token = self.drive_client.get_change_token()
+        with self._lock:
+            if self._files is None:
+                self._page_token = current_token
+                self._files = self.drive_client.list_files(include_shared_drives=self.include_shared_drives)
+                self._dirty = False
+            elif self._dirty or current_token != self._page_token:
+                self._apply_changes()
+            self._ensure_channel()
+            return [dict(file) for file in self._files]
+
+    def mark_dirty(self) -> None:
+        """Make the next listing apply the changes feed, e.g. after this app uploaded or deleted a file"""
+        self._dirty = True
+
+    def notify(self, state: str) -> None:
+        """
+        Handle a verified notification. 'sync' only confirms a new channel, anything else schedules a refresh.
+        Refreshes run on a single background thread and pings arriving while one is queued are coalesced into it
+        """
+        if state == 'sync':
+            return
+        with self._lock:
+            self._dirty = True
+            if self._refresh_queued or self._files is None:
+                return
+            self._refresh_queued = True
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='drive-watch')
+        self._executor.submit(self._background_refresh)
+
+    def _background_refresh(self) -> None:
+        with self._lock:
+            self._refresh_queued = False
+            if not self._dirty:
+                return
+            try:
+                self._apply_changes()
+            except Exception as e:
+                print(f"Error applying drive changes: {str(e)}")
+
+    def _apply_changes(self) -> None:
+        """Apply the changes feed since the snapshot's change token to the snapshot. Called with the lock held"""
+        self._dirty = False
+        changes, self._page_token = self.drive_client.list_changes(self._page_token, self.include_shared_drives)
+        if not changes:
+            return
+
+        removed = set()
+        renamed_folders: Dict[str, str] = {}
+        #latest state of every changed file, a file can change several times between two refreshes
+        changed: Dict[str, Dict[str, Any]] = {}
+        for change in changes:
+            file_id = change.get('fileId')
+            if not file_id:
+                continue
+            if self.drive_client.content_cache is not None:
+                self.drive_client.content_cache.invalidate(file_id)
+            self.drive_client.forget_listing_revision(file_id)
+            file = change.get('file')
+            #trashed files aren't listed, so moving a file to the trash removes it from the snapshot
+            if change.get('removed') or not file or file.get('trashed'):
+                removed.add(file_id)
+                changed.pop(file_id, None)
+            elif file.get('mimeType') == DriveClient.FOLDER_MIME_TYPE:
+                #folders aren't listed but their names are shown next to the files inside them
+                renamed_folders[file_id] = file.get('name', '')
+            else:
+                changed[file_id] = file
+                removed.discard(file_id)
+
+        if renamed_folders:
+            self.drive_client.invalidate_folder_map()
+        if changed:
+            self.drive_client.enrich_files(list(changed.values()))
+
+        positions = {file['id']: index for index, file in enumerate(self._files)}
+        new_files = []
+        for file_id, file in changed.items():
+            index = positions.get(file_id)
+            if index is None:
+                new_files.append(file)
+                continue
+            previous = self._files[index]
+            if previous.get('parents') == file.get('parents'):
+                #shared drive folder names are resolved per drive by list_files, keep them while the file stays put
+                for key in ('folderName', 'driveId', 'driveName'):
+                    if key in previous:
+                        file[key] = previous[key]
+            self._files[index] = file
+        #new files go first, most recent first, the way they'd show up in drive
+        self._files[:0] = reversed(new_files)
+
+        for file in self._files:
+            parents = file.get('parents')
+            if parents and parents[0] in renamed_folders:
+                file['folderName'] = renamed_folders[parents[0]]
+        if removed:
+            self._files = [file for file in self._files if file['id'] not in removed]
+
+    def _channel_active(self) -> bool:
+        if self.local:
+            return self._notifier is not None and self._notifier.is_alive()
+        return self._channel is not None and time.time() < self._channel['expiration'] - self.RENEW_MARGIN
+
+    def _ensure_channel(self) -> None:
+        """Open a notification channel when there is none or the current one is about to expire. Called with the lock held"""
+        if self._channel_active() or time.time() < self._channel_retry_at or not self._owns_channel():
+            return
+        if self.local:
+            self._notifier = LocalNotifier(self.address, self.token, self.drive_client, interval=self.poll_interval)
+            self._notifier.start()
+            return
+
+        previous = self._channel
+        try:
+            channel_id = str(uuid.uuid4())
+            channel = self.drive_client.watch_changes(self._page_token, self.address, channel_id, self.token,
+                                                      time.time() + self.ttl, self.include_shared_drives)
+        except Exception as e:
+            print(f"Error opening drive notification channel: {str(e)}")
+            self._channel_retry_at = time.time() + self.RETRY_INTERVAL
+            return
+        expiration = int(channel.get('expiration') or 0) / 1000 or time.time() + self.ttl
+        self._channel = {'id': channel_id, 'resourceId': channel.get('resourceId'), 'expiration': expiration}
+        #the new channel is open before the old one is stopped so no change goes unnoticed
+        if previous is not None:
+            self._stop_channel(previous)
+
+    def _owns_channel(self) -> bool:
+        """Whether this process may open the channel, taking the lock file when it is free. Called with the lock held"""
+        if self.lock_file is None or fcntl is None or self._lock_handle is not None:
+            return True
+        handle = open(self.lock_file, 'a')
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            #another worker owns the channel
+            handle.close()
+            return False
+        handle.truncate(0)
+        handle.write(str(os.getpid()))
+        handle.flush()
+        self._lock_handle = handle
+        return True
+
+    def _stop_channel(self, channel: Dict[str, Any]) -> None:
+        try:
+            self.drive_client.stop_channel(channel['id'], channel['resourceId'])
+        except Exception as e:
+            print(f"Error stopping drive notification channel: {str(e)}")
+
+    def stop(self) -> None:
+        """Stop the notification channel or local notifier. Registered to run at exit"""
+        with self._lock:
+            if self._channel is not None:
+                self._stop_channel(self._channel)
+                self._channel = None
+            if self._notifier is not None:
+                self._notifier.stop()
+                self._notifier = None
+            if self._lock_handle is not None:
+                #closing the file releases the lock for the next worker
+                self._lock_handle.close()
+                self._lock_handle = None
+
+
+class LocalNotifier:
+    """
+    Stand in for drive push notifications during local development, since google only delivers to public https addresses.
+    Polls the drive change token and posts a drive style notification to the webhook whenever it moves.
+    Can also post a single notification by hand: python -m src.drive.watch <webhook url> <token>
+    """
+
+    def __init__(self, address: str, token: str, drive_client: Optional[DriveClient] = None, interval: float = 30,
+                 channel_id: str = 'local'):
+        """
+        Args:
+            address: Url of the webhook
+            token: Secret the webhook expects
+            drive_client: DriveClient polled for changes. Only needed when started
+            interval: Seconds between polls
+            channel_id: Channel id sent with the notifications
+        """
+        self.address = address
+        self.token = token
+        self.drive_client = drive_client
+        self.interval = interval
+        self.channel_id = channel_id
+        self._message_number = 0
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def post(self, state: str = 'change') -> int:
+        """Post one notification to the webhook. Returns the http status"""
+        self._message_number += 1
+        request = urllib.request.Request(self.address, data=b'', method='POST', headers={
+            CHANNEL_ID_HEADER: self.channel_id,
+            CHANNEL_TOKEN_HEADER: self.token,
+            RESOURCE_STATE_HEADER: state,
+            RESOURCE_ID_HEADER: 'local',
+            MESSAGE_NUMBER_HEADER: str(self._message_number),
+        })
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+
+    def _run(self) -> None:
+        token = None
+        while not self._stopped.is_set():
+            try:
+                current = self.drive_client.get_change_token()
+                if token is not None and current != token:
+                    self.post('change')
+                token = current
+            except Exception as e:
+                print(f"Error polling drive changes: {str(e)}")
+            self._stopped.wait(self.interval)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='drive-local-notifier', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stopped.is_set()
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) < 3:
+        sys.exit('usage: python -m src.drive.watch <webhook url> <token> [state]')
+    print(LocalNotifier(sys.argv[1], sys.argv[2]).post(sys.argv[3] if len(sys.argv) > 3 else 'change'))
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Any
+from typing import List, Optional, Any, ContextManager
 from pathlib import Path
 
 
@@ -46,4 +46,13 @@ class AuthProvider(ABC):
     @abstractmethod
     def refresh_credentials(self) -> bool:
         """Refreshes expired credentials"""
-        pass
\ No newline at end of file
+        pass
+
+class Tracer(ABC):
+    """Interface for tracing backends. Spans are opened as context managers so that nested calls (route -> drive api call -> media chunk)
+    are recorded with their parent. Implementations may be a no-op, a local file exporter or an adapter to OpenTelemetry"""
+
+    @abstractmethod
+    def start_span(self, name: str, attributes: Optional[dict] = None) -> ContextManager[Any]:
+        """Open a span with the given name and attributes. The yielded span supports set_attribute(key, value)"""
+        pass
@@ -0,0 +1,78 @@
+import os
+from typing import Any, Dict
+from flask import Flask
+from src.config import DefaultDriveConfig
+from src.drive.driveclient import DriveClient
+
+"""
+Production server for the flask application. Runs the app under gunicorn with a pool of pre-forked worker processes,
+each serving requests on several threads. The app and the drive discovery document are loaded once in the master
+process before forking so workers share that memory, and shutdown waits for in flight transfers to drain.
+"""
+
+
+def gunicorn_options(config: DefaultDriveConfig) -> Dict[str, Any]:
+    """Translate the server settings of the configuration into gunicorn options"""
+    options = {
+        'bind': config.server_bind,
+        'workers': config.server_workers,
+        #threaded workers keep serving while some threads wait on slow drive transfers
+        'worker_class': 'gthread',
+        'threads': config.server_threads,
+        #for threaded workers the timeout is a heartbeat, long downloads don't trip it
+        'timeout': config.server_timeout,
+        'graceful_timeout': config.server_graceful_timeout,
+        'keepalive': config.server_keepalive,
+        'preload_app': True,
+        'post_fork': post_fork,
+        'accesslog': '-',
+    }
+    #heartbeat files on a tmpfs avoid workers stalling on slow disks in containers
+    if os.path.isdir('/dev/shm'):
+        options['worker_tmp_dir'] = '/dev/shm'
+    return options
+
+def post_fork(server, worker) -> None:
+    """
+    Gunicorn hook run in every worker after forking. Connections opened in the master must not be reused by the workers.
+    The content cache index is per process, so each worker gets an equal share of the byte budget to keep the shared
+    directory within STRAC_CACHE_MAX_BYTES
+    """
+    drive_client = server.app.application.config.get('drive_client')
+    if drive_client is not None:
+        drive_client.reset_connections()
+        if drive_client.content_cache is not None:
+            drive_client.content_cache.max_bytes = per_worker_budget(drive_client.content_cache.max_bytes, server.cfg.workers)
+
+def per_worker_budget(max_bytes: int, workers: int) -> int:
+    """Share of a byte budget each of several worker processes may use"""
+    return max_bytes // max(1, workers)
+
+def load_application() -> Flask:
+    """Create the flask app with the drive discovery document already parsed, so it is shared by the forked workers"""
+    from src.app import create_app
+    DriveClient.preload()
+    return create_app()
+
+def main() -> None:
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit('gunicorn is required for the production server: pip install gunicorn (on Windows use a WSGI server such as waitress with run:app)')
+
+    class Application(BaseApplication):
+        """Embedded gunicorn application so the server is configured from the app configuration instead of a command line"""
+
+        def __init__(self, application: Flask, options: Dict[str, Any]):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    Application(load_application(), gunicorn_options(DefaultDriveConfig())).run()
@@ -0,0 +1,69 @@
+import gzip
+import zlib
+from typing import Iterable, Iterator
+from flask import Flask, request, Response
+
+
+#mime types worth compressing. Downloads are excluded since they're usually compressed already and served with ranges
+COMPRESSIBLE_MIME_TYPES = {
+    'text/html',
+    'text/plain',
+    'text/css',
+    'text/csv',
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+}
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int) -> Iterator[bytes]:
+    """
+    Gzip a stream of chunks. Each chunk is flushed as it arrives so a client reading a streamed response
+    receives every chunk without waiting for the compressor to fill its window
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if not chunk:
+            continue
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+def _should_compress(response: Response) -> bool:
+    if response.status_code != 200 or response.direct_passthrough:
+        return False
+    if 'Content-Encoding' in response.headers:
+        return False
+    if response.mimetype not in COMPRESSIBLE_MIME_TYPES:
+        return False
+    return request.accept_encodings['gzip'] > 0
+
+def register_compression(app: Flask, min_size: int = 500, level: int = 6) -> None:
+    """
+    Gzip html and json responses for clients that accept it.
+    Buffered responses below min_size bytes are sent as is since the gzip framing outweighs the savings.
+    Streamed responses are compressed incrementally chunk by chunk
+
+    Args:
+        app: Flask application to register the hook on
+        min_size: Smallest buffered body in bytes that gets compressed
+        level: zlib compression level
+    """
+
+    @app.after_request
+    def compress_response(response: Response) -> Response:
+        if not _should_compress(response):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if response.is_streamed:
+            response.response = gzip_stream(response.response, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            response.set_data(gzip.compress(data, compresslevel=level))
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+from typing import Dict, Optional, Tuple
+from src.utils.utils import file_md5
+
+
+class HashingReader:
+    """
+    Read only file wrapper that computes the md5 of a file while an upload reads it.
+    Uploads read in chunks and may seek back to resend a chunk, so only bytes past what was already hashed are added
+    and the digest is only available once every byte was read in order
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self._digest = hashlib.md5()
+        self._hashed = 0
+        self.size = os.fstat(self._file.fileno()).st_size
+
+    def read(self, size: int = -1) -> bytes:
+        position = self._file.tell()
+        data = self._file.read(size)
+        end = position + len(data)
+        if position <= self._hashed < end:
+            self._digest.update(data[self._hashed - position:])
+            self._hashed = end
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def hexdigest(self) -> Optional[str]:
+        """md5 of the whole file, or None when it wasn't read completely"""
+        return self._digest.hexdigest() if self._hashed == self.size else None
+
+
+class FileHashCache:
+    """
+    Remembers the md5 of local files so unchanged files aren't read again to compare them with drive.
+    Entries are keyed by absolute path and only trusted while the file's size and modification time are unchanged.
+    The cache is an append only json lines file, so recording a hash is a single small write; it is compacted on load
+    once superseded lines outnumber the live entries
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: File the hashes are stored in. Created on first write
+        """
+        self.path = str(path)
+        self._lock = threading.Lock()
+        #absolute path -> (size, mtime_ns, md5)
+        self._entries: Optional[Dict[str, Tuple[int, int, str]]] = None
+
+    @staticmethod
+    def _stat(path: str) -> Tuple[str, int, int]:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        return path, stat.st_size, stat.st_mtime_ns
+
+    def _load(self) -> Dict[str, Tuple[int, int, str]]:
+        """Load the entries on first use. Called with the lock held"""
+        if self._entries is not None:
+            return self._entries
+        entries = {}
+        lines = 0
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        entries[record['path']] = (record['size'], record['mtime'], record['md5'])
+                        lines += 1
+                    except (ValueError, KeyError, TypeError):
+                        #a torn last line from an interrupted write is skipped
+                        continue
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error loading hash cache: {str(e)}", file=sys.stderr)
+        self._entries = entries
+        if lines > 2 * len(entries) + 100:
+            self._compact()
+        return entries
+
+    def _compact(self) -> None:
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                for path, (size, mtime, md5) in self._entries.items():
+                    f.write(json.dumps({'path': path, 'size': size, 'mtime': mtime, 'md5': md5}) + '\n')
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Error compacting hash cache: {str(e)}", file=sys.stderr)
+
+    def get(self, path: str) -> Optional[str]:
+        """Cached md5 of a local file, or None when unknown or the file changed since it was hashed"""
+        path, size, mtime = self._stat(path)
+        with self._lock:
+            entry = self._load().get(path)
+        if entry is None or entry[0] != size or entry[1] != mtime:
+            return None
+        return entry[2]
+
+    def put(self, path: str, md5: str, stat: Optional[Tuple[int, int]] = None) -> None:
+        """
+        Record the md5 of a local file
+
+        Args:
+            path: Local file
+            md5: Its md5 hex digest
+            stat: (size, mtime_ns) the file had when it was hashed. Defaults to its current state
+        """
+        path, size, mtime = self._stat(path)
+        if stat is not None and stat != (size, mtime):
+            #the file changed while it was being hashed
+            return
+        with self._lock:
+            self._load()[path] = (size, mtime, md5)
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps({'path': path, 'size': size, 'mtime': mtime, 'md5': md5}) + '\n')
+            except OSError as e:
+                print(f"Error saving hash cache: {str(e)}", file=sys.stderr)
+
+    def md5(self, path: str) -> str:
+        """md5 of a local file, from the cache when the file is unchanged, otherwise read and recorded"""
+        md5 = self.get(path)
+        if md5 is None:
+            _, size, mtime = self._stat(path)
+            md5 = file_md5(path)
+            self.put(path, md5, (size, mtime))
+        return md5
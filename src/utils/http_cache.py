@@ -0,0 +1,46 @@
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+def parse_drive_time(value: Optional[str]) -> Optional[datetime]:
+    """Parse an RFC 3339 timestamp as returned by the drive api (e.g. 2024-01-01T00:00:00.000Z)"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+def listing_etag(change_token: Optional[str] = None, files: Optional[Iterable[Dict[str, Any]]] = None) -> str:
+    """
+    Build the etag for a file listing. The drive change token advances whenever anything in the drive changes so it is
+    preferred since it can be checked without listing. Otherwise the etag is a digest of every file id and modified time
+
+    Returns:
+        Opaque etag value, the caller marks it weak since it doesn't describe the rendered bytes
+    """
+    if change_token:
+        return f'changes-{change_token}'
+
+    digest = hashlib.sha1()
+    for file in files or []:
+        digest.update(f"{file.get('id')}:{file.get('modifiedTime')};".encode('utf-8'))
+    return f'files-{digest.hexdigest()}'
+
+def file_validators(metadata: Dict[str, Any], export_format: Optional[str] = None) -> Tuple[Optional[str], bool, Optional[datetime]]:
+    """
+    Derive http validators for a drive file from its metadata.
+    Binary files have an md5Checksum of their exact bytes which makes a strong etag. Google Workspace files only have a modified time
+    and their export isn't byte stable, so they get a weak etag (one per export format) which rules out range requests
+
+    Returns:
+        Tuple of (etag, is_weak, last_modified)
+    """
+    last_modified = parse_drive_time(metadata.get('modifiedTime'))
+    if metadata.get('md5Checksum'):
+        return metadata['md5Checksum'], False, last_modified
+    if metadata.get('modifiedTime'):
+        version = metadata.get('headRevisionId') or metadata['modifiedTime']
+        return hashlib.sha1(f"{metadata.get('id')}:{version}:{export_format or ''}".encode('utf-8')).hexdigest(), True, last_modified
+    return None, True, last_modified
@@ -0,0 +1,44 @@
+import importlib
+import threading
+from typing import Any
+
+
+class LazyImport:
+    """
+    Stand in for a name imported from a module that is only imported on first use.
+    Attribute access and calls are forwarded to the real object, so `Credentials = LazyImport('google.oauth2.credentials', 'Credentials')`
+    keeps working like the import it replaces while keeping the google libraries out of startup.
+    Only the module is kept once imported; the name is looked up on it at every use, so patching the source module
+    (e.g. `googleapiclient.discovery.build`) applies while the patch is active and is dropped when it ends
+    """
+
+    def __init__(self, module: str, name: str):
+        """
+        Args:
+            module: Dotted module path to import from
+            name: Name of the object in that module
+        """
+        self._module = module
+        self._name = name
+        self._module_object = None
+        self._lock = threading.Lock()
+
+    def resolve(self) -> Any:
+        """Import the module if needed and return the object currently bound to the name"""
+        module = self._module_object
+        if module is None:
+            with self._lock:
+                if self._module_object is None:
+                    self._module_object = importlib.import_module(self._module)
+                module = self._module_object
+        return getattr(module, self._name)
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __getattr__(self, attribute: str) -> Any:
+        #only called for attributes not set in __init__, i.e. the ones of the real object
+        return getattr(self.resolve(), attribute)
+
+    def __repr__(self) -> str:
+        return f'<lazy {self._module}.{self._name}>'
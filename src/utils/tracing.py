@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from src.interfaces.interface import Tracer
+
+
+class Span:
+    """
+    Lightweight span record used by the local tracers. Mirrors the subset of the OpenTelemetry span api used by the application
+    so instrumented code doesn't need to know which backend is active
+    """
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, attributes: Optional[dict] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = 'ok'
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = 'error'
+        self.attributes['exception.type'] = type(exc).__name__
+        self.attributes['exception.message'] = str(exc)
+
+    def to_dict(self) -> Dict[str, Any]:
+        end_time = self.end_time if self.end_time is not None else time.time()
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_time': self.start_time,
+            'end_time': end_time,
+            'duration_ms': round((end_time - self.start_time) * 1000, 3),
+            'status': self.status,
+            'attributes': self.attributes,
+        }
+
+
+class _NoOpSpan:
+    """Span returned by the no-op tracer. Accepts and discards everything"""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+
+class NoOpTracer(Tracer):
+    """Default tracer. Costs a single context manager per span and records nothing"""
+
+    _span = _NoOpSpan()
+
+    @contextmanager
+    def start_span(self, name: str, attributes: Optional[dict] = None) -> Iterator[_NoOpSpan]:
+        yield self._span
+
+
+class LocalTracer(Tracer):
+    """
+    Tracer that keeps spans in process and hands finished spans to an export function.
+    Parent/child relationships are tracked per thread so concurrent requests produce separate traces
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _stack(self) -> List[Span]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def start_span(self, name: str, attributes: Optional[dict] = None) -> Iterator[Span]:
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        span = Span(
+            name,
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes
+        )
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            span.end_time = time.time()
+            stack.pop()
+            self.export(span)
+
+    def export(self, span: Span) -> None:
+        """Called with every finished span. Subclasses decide where spans go"""
+        pass
+
+
+class InMemoryTracer(LocalTracer):
+    """Tracer that collects finished spans in a list. Useful for tests and ad hoc profiling"""
+
+    def __init__(self):
+        super().__init__()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+
+class FileTracer(LocalTracer):
+    """
+    Tracer that appends every finished span as a json line to a local file so traces can be analysed offline.
+    Children are written before their parents since spans are exported when they finish
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        try:
+            with self._lock:
+                with open(self.path, 'a') as f:
+                    f.write(line + '\n')
+        except Exception as e:
+            print(f"Error writing trace span: {str(e)}")
+
+
+class OpenTelemetryTracer(Tracer):
+    """
+    Adapter that forwards spans to OpenTelemetry. Exporters and sampling are configured through the regular
+    opentelemetry sdk setup, this class only opens the spans
+    """
+
+    def __init__(self, instrumentation_name: str = 'strac-takehome'):
+        from opentelemetry import trace
+        self._tracer = trace.get_tracer(instrumentation_name)
+
+    @contextmanager
+    def start_span(self, name: str, attributes: Optional[dict] = None) -> Iterator[Any]:
+        with self._tracer.start_as_current_span(name, attributes=_otel_attributes(attributes)) as span:
+            yield span
+
+
+def _otel_attributes(attributes: Optional[dict]) -> Dict[str, Any]:
+    """OpenTelemetry only accepts primitive attribute values so anything else is stringified"""
+    return {
+        key: value if isinstance(value, (str, bool, int, float)) else str(value)
+        for key, value in (attributes or {}).items()
+        if value is not None
+    }
+
+
+def create_tracer(trace_file: Optional[str] = None, use_opentelemetry: bool = False) -> Tracer:
+    """
+    Build the tracer selected by configuration. A trace file takes precedence over OpenTelemetry
+    and if neither is configured (or opentelemetry isn't installed) a no-op tracer is returned
+    """
+    if trace_file:
+        return FileTracer(trace_file)
+    if use_opentelemetry:
+        try:
+            return OpenTelemetryTracer()
+        except ImportError:
+            print("OpenTelemetry requested but not installed, tracing disabled")
+    return NoOpTracer()
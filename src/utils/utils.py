@@ -1,5 +1,24 @@
+import hashlib
 import ntpath
 
 def path_leaf(path):
     head, tail = ntpath.split(path)
-    return tail or ntpath.basename(head)
\ No newline at end of file
+    return tail or ntpath.basename(head)
+
+def file_md5(path, chunk_size=1024 * 1024):
+    """md5 hex digest of a local file, read in chunks. Comparable to the md5Checksum drive reports for binary files"""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def format_size(size):
+    """Human readable byte count (e.g. 1.5M). None, for items without a size, is shown as '-'"""
+    if size is None:
+        return '-'
+    for unit in ('B', 'K', 'M', 'G', 'T'):
+        if size < 1024 or unit == 'T':
+            return f'{size:.0f}{unit}' if unit == 'B' else f'{size:.1f}{unit}'
+        size /= 1024
@@ -31,8 +31,10 @@ def mock_drive():
             'capabilities': {'canEdit': True, 'canDelete': True},
             'shared': False,
             'ownedByMe': True
-        }]
+        }],
+        'nextPageToken': None
     }
+    mock_service.drives().list().execute.return_value = {'drives': [], 'nextPageToken': None}
     
     with patch('google.oauth2.credentials.Credentials', return_value=mock_creds), \
          patch('googleapiclient.discovery.build', return_value=mock_service):
@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import Mock, patch
 from pathlib import Path
+from src.app import create_app
 from src.config import DefaultDriveConfig
 from src.auth.auth_manager import OAuthManager
 from src.drive.driveclient import DriveClient
@@ -29,4 +30,18 @@ def drive_config(mock_home_dir):
 
 @pytest.fixture
 def auth_manager(drive_config):
-    return OAuthManager(drive_config)
\ No newline at end of file
+    return OAuthManager(drive_config)
+
+@pytest.fixture
+def app(mock_home_dir):
+    """Flask app built against the mocked home directory"""
+    app = create_app()
+    app.config['TESTING'] = True
+    app.secret_key = 'test'
+    return app
+
+@pytest.fixture
+def app_client(app, drive_client):
+    """Flask test client with the drive client swapped for the test module's drive_client mock"""
+    app.config['drive_client'] = drive_client
+    return app.test_client()
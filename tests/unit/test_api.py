@@ -0,0 +1,89 @@
+import json
+import pytest
+from unittest.mock import Mock, patch
+from src.drive.driveclient import DriveClient
+
+
+@pytest.fixture
+def drive_client():
+    return Mock()
+
+def test_api_files_returns_page_and_cursor(app_client, drive_client):
+    drive_client.list_files_page.return_value = {'files': [{'id': '1'}], 'nextPageToken': 'next'}
+
+    response = app_client.get('/api/files?cursor=abc&page_size=5000')
+
+    assert response.status_code == 200
+    assert response.get_json() == {'files': [{'id': '1'}], 'nextCursor': 'next'}
+    drive_client.list_files_page.assert_called_once_with('abc', 1000)
+
+def test_api_files_error(app_client, drive_client):
+    drive_client.list_files_page.side_effect = Exception('quota')
+
+    response = app_client.get('/api/files')
+
+    assert response.status_code == 500
+    assert 'quota' in response.get_json()['error']
+
+def test_api_files_ndjson_streams_pages(app_client, drive_client):
+    drive_client.iter_file_pages.return_value = iter([[{'id': '1'}, {'id': '2'}], [{'id': '3'}]])
+
+    response = app_client.get('/api/files', headers={'Accept': 'application/x-ndjson'})
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line)['id'] for line in response.data.decode().splitlines()] == ['1', '2', '3']
+
+@patch('src.drive.driveclient.build')
+def test_iter_file_pages_follows_cursor(mock_build):
+    """Pages are requested with the cursor of the previous page and the folder map is fetched once"""
+    drive_client = DriveClient(Mock())
+    files_mock = mock_build.return_value.files.return_value
+    files_mock.list.return_value.execute.side_effect = [
+        {'files': [{'id': 'folder1', 'name': 'Docs'}]},
+        {'files': [{'id': '1', 'mimeType': 'text/plain', 'parents': ['folder1']}], 'nextPageToken': 'page2'},
+        {'files': [{'id': '2', 'mimeType': 'text/plain'}]},
+    ]
+
+    pages = list(drive_client.iter_file_pages(page_size=1))
+
+    assert [[file['id'] for file in page] for page in pages] == [['1'], ['2']]
+    assert pages[0][0]['folderName'] == 'Docs'
+    assert pages[1][0]['folderName'] == 'N/A'
+    assert files_mock.list.call_args_list[2][1]['pageToken'] == 'page2'
+    #the trash is left out of files and folders like in the html listing
+    assert all('trashed = false' in call.kwargs['q'] for call in files_mock.list.call_args_list)
+
+def test_api_storage_reports_usage(app_client, drive_client):
+    folder = 'application/vnd.google-apps.folder'
+    drive_client.iter_files.return_value = iter([
+        {'id': 'f', 'name': 'Videos', 'mimeType': folder, 'parents': ['root']},
+        {'id': '1', 'name': 'a.mp4', 'mimeType': 'video/mp4', 'size': '1000', 'parents': ['f']},
+    ])
+
+    response = app_client.get('/api/storage?top=5')
+
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['totalBytes'] == 1000
+    assert report['children'][0]['path'] == 'Videos'
+
+def test_storage_page_renders(app_client, drive_client):
+    drive_client.iter_files.return_value = iter([{'id': '1', 'name': 'a.mp4', 'mimeType': 'video/mp4', 'size': '2048'}])
+
+    response = app_client.get('/storage')
+
+    assert response.status_code == 200
+    assert b'2.0K' in response.data and b'video/mp4' in response.data
+
+def test_delete_duplicates_only_trashes_redundant_copies(app_client, drive_client):
+    drive_client.iter_files.return_value = iter([
+        {'id': 'old', 'name': 'a.bin', 'size': '10', 'md5Checksum': 'x', 'createdTime': '2024-01-01', 'ownedByMe': True},
+        {'id': 'copy', 'name': 'a.bin', 'size': '10', 'md5Checksum': 'x', 'createdTime': '2024-02-01', 'ownedByMe': True},
+    ])
+    drive_client.trash_file.return_value = True
+
+    response = app_client.post('/api/duplicates/delete', json={'fileIds': ['copy', 'old', 'unrelated']})
+
+    assert response.get_json() == {'trashed': ['copy'], 'failed': [], 'rejected': ['old', 'unrelated']}
+    drive_client.trash_file.assert_called_once_with('copy')
+    drive_client.delete_file.assert_not_called()
@@ -0,0 +1,89 @@
+import io
+import zipfile
+import pytest
+from unittest.mock import Mock
+from src.drive.archive import ArchiveStreamer
+
+
+@pytest.fixture
+def drive_client():
+    contents = {'1': [b'hello ', b'world'], '2': [b'x' * 5000], '3': [b'doc']}
+
+    def iter_content(file_id, metadata=None, export_format=None, chunk_size=None):
+        if file_id == 'bad':
+            raise IOError('quota exceeded')
+        yield from contents[file_id]
+
+    drive_client = Mock()
+    drive_client.iter_content.side_effect = iter_content
+    return drive_client
+
+def read_zip(chunks):
+    return zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+def test_stream_writes_entries_in_order(drive_client):
+    streamer = ArchiveStreamer(drive_client, max_in_flight=2, queue_chunks=1)
+    entries = [
+        ('1', {'mimeType': 'text/plain'}, 'a.txt'),
+        ('2', {'mimeType': 'text/plain'}, 'dir/b.txt'),
+        ('3', {'mimeType': 'text/plain'}, 'a.txt'),
+    ]
+
+    archive = read_zip(streamer.stream(entries))
+
+    assert archive.namelist() == ['a.txt', 'dir/b.txt', 'a (1).txt']
+    assert archive.read('a.txt') == b'hello world'
+    assert archive.read('dir/b.txt') == b'x' * 5000
+
+def test_failed_download_becomes_error_entry(drive_client):
+    streamer = ArchiveStreamer(drive_client)
+
+    archive = read_zip(streamer.stream([('bad', {}, 'bad.bin'), ('1', {}, 'a.txt')]))
+
+    assert 'quota exceeded' in archive.read('bad.bin.error.txt').decode()
+    assert 'bad.bin' not in archive.namelist()
+    assert archive.read('a.txt') == b'hello world'
+
+def test_download_failing_midway_is_marked_incomplete(drive_client):
+    def iter_content(file_id, metadata=None, export_format=None, chunk_size=None):
+        yield b'first half'
+        raise IOError('connection reset')
+    drive_client.iter_content.side_effect = iter_content
+
+    archive = read_zip(ArchiveStreamer(drive_client).stream([('1', {}, 'a.txt')]))
+
+    assert archive.read('a.txt') == b'first half'
+    assert archive.read('a.txt.error.txt').decode().startswith('a.txt in this archive is incomplete')
+
+def test_file_entries_report_metadata_errors(drive_client):
+    def get_file_metadata(file_id):
+        if file_id == 'bad':
+            raise IOError('File not found: bad')
+        return {'id': file_id, 'name': f'{file_id}.txt', 'mimeType': 'text/plain'}
+    drive_client.get_file_metadata.side_effect = get_file_metadata
+    streamer = ArchiveStreamer(drive_client)
+
+    archive = read_zip(streamer.stream(streamer.file_entries(['1', 'bad', '3'])))
+
+    assert archive.namelist() == ['1.txt', 'bad.error.txt', '3.txt']
+    assert 'File not found' in archive.read('bad.error.txt').decode()
+
+def test_folder_entries_keep_structure_and_skip_contentless_items(drive_client):
+    drive_client.walk.return_value = iter([
+        {'id': 'f', 'name': 'Sub', 'mimeType': 'application/vnd.google-apps.folder', 'path': ''},
+        {'id': '1', 'name': 'a.txt', 'mimeType': 'text/plain', 'path': 'Sub'},
+        {'id': '3', 'name': 'Notes', 'mimeType': 'application/vnd.google-apps.document', 'path': ''},
+    ])
+
+    entries = list(ArchiveStreamer(drive_client).folder_entries('root'))
+
+    assert [name for _, _, name in entries] == ['Sub/a.txt', 'Notes.docx']
+
+def test_download_zip_route(app_client, drive_client):
+    drive_client.get_file_metadata.side_effect = lambda file_id: {'id': file_id, 'name': f'{file_id}.txt', 'mimeType': 'text/plain'}
+
+    response = app_client.get('/download-zip?file_id=1&file_id=2&name=export')
+
+    assert response.mimetype == 'application/zip'
+    assert 'filename="export.zip"' in response.headers['Content-Disposition']
+    assert read_zip([response.data]).namelist() == ['1.txt', '2.txt']
@@ -0,0 +1,130 @@
+import json
+import pytest
+from unittest.mock import Mock
+from src.cli import main, resolve, CliError
+from src.utils.utils import file_md5
+
+FOLDER = 'application/vnd.google-apps.folder'
+
+#folder id -> children of a small fake drive
+TREE = {
+    'root': [{'id': 'reports', 'name': 'Reports', 'mimeType': FOLDER}],
+    'reports': [
+        {'id': 'q1', 'name': 'q1.pdf', 'mimeType': 'application/pdf', 'size': '10', 'md5Checksum': 'aaa'},
+        {'id': 'q2', 'name': 'q2.pdf', 'mimeType': 'application/pdf', 'size': '20', 'md5Checksum': 'bbb'},
+        {'id': 'notes', 'name': 'notes', 'mimeType': 'application/vnd.google-apps.document', 'modifiedTime': '2024-01-01T00:00:00.000Z'},
+        {'id': 'old', 'name': 'old', 'mimeType': FOLDER},
+    ],
+    'old': [{'id': 'q0', 'name': 'q0.pdf', 'mimeType': 'application/pdf', 'size': '5', 'md5Checksum': 'ccc'}],
+}
+
+
+@pytest.fixture
+def drive():
+    drive = Mock()
+
+    def list_children(folder_id='root', name=None, fields=None):
+        return [dict(child) for child in TREE.get(folder_id, []) if name is None or child['name'] == name]
+
+    def walk(folder_id='root', fields=None, path=''):
+        for child in TREE.get(folder_id, []):
+            yield dict(child, path=path)
+            if child['mimeType'] == FOLDER:
+                yield from walk(child['id'], fields, f"{path}/{child['name']}" if path else child['name'])
+
+    drive.list_children.side_effect = list_children
+    drive.walk.side_effect = walk
+    drive.download_file.return_value = True
+    drive.local_md5.side_effect = file_md5
+    return drive
+
+def run(drive, capsys, *argv):
+    status = main(list(argv), drive=drive)
+    return status, capsys.readouterr()
+
+def test_resolve_paths_and_globs(drive):
+    assert [item['id'] for item in resolve(drive, 'Reports/q*.pdf')] == ['q1', 'q2']
+    assert resolve(drive, '/')[0]['id'] == 'root'
+    with pytest.raises(CliError):
+        resolve(drive, 'Reports/missing.txt')
+
+def test_ls_json(drive, capsys):
+    status, captured = run(drive, capsys, 'ls', '--json', 'Reports')
+    records = [json.loads(line) for line in captured.out.splitlines()]
+    assert status == 0
+    #folders first, then files by name
+    assert [record['path'] for record in records] == ['Reports/old', 'Reports/notes', 'Reports/q1.pdf', 'Reports/q2.pdf']
+    assert records[2]['size'] == 10
+
+def test_find_by_name(drive, capsys):
+    status, captured = run(drive, capsys, 'find', '--name', '*.pdf')
+    assert captured.out.splitlines() == ['Reports/q1.pdf', 'Reports/q2.pdf', 'Reports/old/q0.pdf']
+
+def test_get_folder_keeps_structure(drive, capsys, tmp_path):
+    status, captured = run(drive, capsys, 'get', '-q', 'Reports', str(tmp_path))
+    assert status == 0
+    destinations = sorted(call.args[1] for call in drive.download_file.call_args_list)
+    assert destinations == sorted([
+        str(tmp_path / 'Reports' / 'q1.pdf'), str(tmp_path / 'Reports' / 'q2.pdf'),
+        str(tmp_path / 'Reports' / 'notes.docx'), str(tmp_path / 'Reports' / 'old' / 'q0.pdf'),
+    ])
+
+def test_get_format_applies_to_workspace_files_only(drive, capsys, tmp_path):
+    status, captured = run(drive, capsys, 'get', '-q', '--format', 'pdf', 'Reports/notes', 'Reports/q1.pdf', str(tmp_path))
+    assert status == 0
+    calls = {call.args[1]: call.kwargs['export_format'] for call in drive.download_file.call_args_list}
+    assert calls == {str(tmp_path / 'notes.pdf'): 'pdf', str(tmp_path / 'q1.pdf'): None}
+
+def test_get_reports_failures(drive, capsys, tmp_path):
+    drive.download_file.return_value = False
+    status, captured = run(drive, capsys, 'get', '--json', 'Reports/q1.pdf', str(tmp_path / 'q1.pdf'))
+    assert status == 1
+    assert json.loads(captured.out)['ok'] is False
+    assert 'FAILED' in captured.err
+
+def test_json_output_carries_errors(drive, capsys, tmp_path):
+    drive.download_file.side_effect = IOError('File not found: q1')
+    drive.delete_file.side_effect = IOError('insufficient permissions')
+
+    status, captured = run(drive, capsys, 'get', '--json', 'Reports/q1.pdf', str(tmp_path / 'q1.pdf'))
+    assert status == 1
+    assert json.loads(captured.out)['error'] == 'File not found: q1'
+    assert drive.download_file.call_args.kwargs['raise_errors'] is True
+
+    status, captured = run(drive, capsys, 'rm', '--json', 'Reports/q2.pdf')
+    assert status == 1
+    record = json.loads(captured.out)
+    assert record['ok'] is False and record['error'] == 'insufficient permissions'
+
+def test_rm_requires_recursive_for_folders(drive, capsys):
+    status, captured = run(drive, capsys, 'rm', 'Reports/old')
+    assert status == 1
+    drive.delete_file.assert_not_called()
+
+    status, captured = run(drive, capsys, 'rm', 'Reports/q*.pdf')
+    assert status == 0
+    assert sorted(call.args[0] for call in drive.delete_file.call_args_list) == ['q1', 'q2']
+
+def test_sync_up_skips_unchanged(drive, capsys, tmp_path):
+    (tmp_path / 'q1.pdf').write_bytes(b'same')
+    (tmp_path / 'q2.pdf').write_bytes(b'changed')
+    (tmp_path / 'new.pdf').write_bytes(b'new')
+    TREE['reports'][0].update(size='4', md5Checksum=file_md5(str(tmp_path / 'q1.pdf')))
+    try:
+        status, captured = run(drive, capsys, 'sync', '-q', 'up', str(tmp_path), 'Reports')
+    finally:
+        TREE['reports'][0].update(size='10', md5Checksum='aaa')
+
+    assert status == 0
+    drive.update_file.assert_called_once_with('q2', str(tmp_path / 'q2.pdf'))
+    drive.upload_file.assert_called_once_with(str(tmp_path / 'new.pdf'), 'reports')
+
+def test_du_json_report(drive, capsys):
+    drive.walk.side_effect = lambda folder_id, fields=None: iter(TREE['old'])
+
+    status, captured = run(drive, capsys, 'du', '--json', 'Reports/old')
+
+    report = json.loads(captured.out)
+    assert status == 0
+    assert report['path'] == 'Reports/old' and report['totalBytes'] == 5
+    assert report['topFiles'][0]['path'] == 'Reports/old/q0.pdf'
@@ -0,0 +1,59 @@
+import gzip
+import zlib
+import pytest
+from flask import Flask, Response
+from googleapiclient.discovery import build
+from src.utils.compression import register_compression
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    register_compression(app, min_size=100)
+
+    @app.route('/large')
+    def large():
+        return Response('x' * 1000, mimetype='text/html')
+
+    @app.route('/small')
+    def small():
+        return Response('x' * 10, mimetype='text/html')
+
+    @app.route('/stream')
+    def stream():
+        return Response((f'{{"row": {i}}}\n' for i in range(100)), mimetype='application/x-ndjson')
+
+    @app.route('/binary')
+    def binary():
+        return Response(b'x' * 1000, mimetype='application/octet-stream')
+
+    return app.test_client()
+
+def test_large_response_is_gzipped(client):
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == b'x' * 1000
+
+def test_responses_left_alone(client):
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/binary', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/large').headers
+
+def test_streamed_response_is_gzipped_incrementally(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    lines = zlib.decompress(response.data, 47).decode().splitlines()
+    assert lines[0] == '{"row": 0}' and len(lines) == 100
+
+def test_drive_list_requests_ask_for_gzip():
+    """The api client requests gzip for json calls which google only serves when the user agent contains gzip"""
+    service = build('drive', 'v3', developerKey='fake', static_discovery=True)
+
+    list_request = service.files().list(q="mimeType != 'application/vnd.google-apps.folder'")
+
+    assert 'gzip' in list_request.headers['accept-encoding']
+    assert 'gzip' in list_request.headers['user-agent']
@@ -0,0 +1,128 @@
+import os
+import threading
+import pytest
+from unittest.mock import Mock, patch
+from src.drive.cache import ContentCache
+from src.drive.driveclient import DriveClient
+
+
+def write(content):
+    def fetch(path):
+        with open(path, 'wb') as f:
+            f.write(content)
+    return fetch
+
+def test_make_key_requires_version():
+    assert ContentCache.make_key('1', {'md5Checksum': 'abc'}) == '1:abc:'
+    assert ContentCache.make_key('1', {'modifiedTime': 't'}, 'application/pdf') == '1:t:application/pdf'
+    assert ContentCache.make_key('1', {}) is None
+
+def test_get_or_fetch_only_fetches_once(tmp_path):
+    cache = ContentCache(tmp_path, max_bytes=100)
+    fetch = Mock(side_effect=write(b'data'))
+
+    first = cache.get_or_fetch('1:abc:', fetch)
+    second = cache.get_or_fetch('1:abc:', fetch)
+
+    assert first == second
+    assert open(first, 'rb').read() == b'data'
+    fetch.assert_called_once()
+
+def test_lru_eviction(tmp_path):
+    cache = ContentCache(tmp_path, max_bytes=10)
+    cache.get_or_fetch('1:a:', write(b'12345'))
+    cache.get_or_fetch('2:a:', write(b'12345'))
+    #touch the first entry so the second becomes least recently used
+    cache.get('1:a:')
+    cache.get_or_fetch('3:a:', write(b'12345'))
+
+    assert cache.get('1:a:') is not None
+    assert cache.get('2:a:') is None
+    assert cache.get('3:a:') is not None
+    assert cache.total_bytes == 10
+
+def test_failed_fetch_leaves_no_entry(tmp_path):
+    cache = ContentCache(tmp_path, max_bytes=100)
+
+    with pytest.raises(IOError):
+        cache.get_or_fetch('1:a:', Mock(side_effect=IOError('network')))
+
+    assert cache.get('1:a:') is None
+    assert os.listdir(tmp_path) == []
+
+def test_entries_shared_between_processes(tmp_path):
+    """A second index on the same directory (another worker) picks up entries it didn't fetch itself"""
+    first = ContentCache(tmp_path, max_bytes=100)
+    second = ContentCache(tmp_path, max_bytes=100)
+    second.get('0:a:')
+    first.get_or_fetch('1:a:', write(b'data'))
+    fetch = Mock()
+
+    assert open(second.get_or_fetch('1:a:', fetch), 'rb').read() == b'data'
+    fetch.assert_not_called()
+    assert second.total_bytes == 4
+
+def test_concurrent_requests_share_fetch(tmp_path):
+    cache = ContentCache(tmp_path, max_bytes=100)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_fetch(path):
+        calls.append(path)
+        started.set()
+        release.wait(5)
+        write(b'data')(path)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch('1:a:', slow_fetch))) for _ in range(3)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(set(results)) == 1 and len(results) == 3
+
+def test_invalidate_drops_all_revisions(tmp_path):
+    cache = ContentCache(tmp_path, max_bytes=100)
+    cache.get_or_fetch('1:a:', write(b'x'))
+    cache.get_or_fetch('1:a:application/pdf', write(b'y'))
+    cache.get_or_fetch('2:a:', write(b'z'))
+
+    cache.invalidate('1')
+
+    assert cache.get('1:a:') is None and cache.get('1:a:application/pdf') is None
+    assert cache.get('2:a:') is not None
+
+@patch('src.drive.driveclient.MediaIoBaseDownload')
+@patch('src.drive.driveclient.build')
+def test_download_file_uses_cache(mock_build, mock_downloader_class, tmp_path):
+    """A second download of the same revision is copied from the cache without touching the api"""
+    drive_client = DriveClient(Mock(), content_cache=ContentCache(tmp_path / 'cache', max_bytes=100))
+    mock_service = Mock()
+    mock_build.return_value = mock_service
+
+    def next_chunk():
+        mock_downloader_class.call_args[0][0].write(b'content')
+        return None, True
+    mock_downloader_class.return_value.next_chunk.side_effect = next_chunk
+    metadata = {'id': '1', 'mimeType': 'text/plain', 'md5Checksum': 'abc'}
+
+    assert drive_client.download_file('1', str(tmp_path / 'a.txt'), metadata=metadata)
+    assert drive_client.download_file('1', str(tmp_path / 'b.txt'), metadata=metadata)
+
+    assert (tmp_path / 'b.txt').read_bytes() == b'content'
+    mock_service.files.return_value.get_media.assert_called_once_with(fileId='1', supportsAllDrives=True)
+
+def test_index_loaded_on_first_use(tmp_path):
+    directory = tmp_path / 'cache'
+    cache = ContentCache(directory, max_bytes=100)
+    assert not directory.exists()
+
+    key = ContentCache.make_key('file1', {'modifiedTime': 't1'})
+    assert cache.get(key) is None
+    assert directory.exists()
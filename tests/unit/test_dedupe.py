@@ -0,0 +1,56 @@
+from unittest.mock import Mock
+from src.drive.dedupe import DuplicateFinder, find_duplicates, redundant_file_ids, trash_files
+
+
+def file(file_id, size, md5, created='2024-01-01'):
+    return {'id': file_id, 'name': f'{file_id}.bin', 'size': str(size), 'md5Checksum': md5, 'createdTime': created, 'ownedByMe': True}
+
+def test_groups_by_size_then_checksum():
+    finder = DuplicateFinder().add_all([
+        file('a', 100, 'x', '2024-02-01'),
+        file('b', 100, 'x', '2024-01-01'),
+        file('c', 100, 'y'),
+        file('d', 200, 'x'),
+        file('e', 300, 'z'), file('f', 300, 'z'), file('g', 300, 'z'),
+        {'id': 'doc', 'name': 'doc', 'mimeType': 'application/vnd.google-apps.document'},
+        file('empty1', 0, 'd41d8'), file('empty2', 0, 'd41d8'),
+        dict(file('shared', 100, 'x'), ownedByMe=False),
+    ])
+
+    report = finder.report()
+
+    assert report['scannedFiles'] == 11
+    assert [[f['id'] for f in group['files']] for group in report['groups']] == [['e', 'f', 'g'], ['b', 'a']]
+    assert report['duplicateFiles'] == 3
+    assert report['reclaimableBytes'] == 700
+    assert redundant_file_ids(report) == ['f', 'g', 'a']
+
+def test_unique_sizes_keep_one_record():
+    """Files with a unique size are never promoted to candidate groups"""
+    finder = DuplicateFinder().add_all(file(str(i), i + 1, 'x') for i in range(100))
+
+    assert finder._candidates == {}
+    assert len(finder._single) == 100
+    assert finder.report()['groups'] == []
+
+def test_find_duplicates_streams_listing():
+    drive_client = Mock()
+    drive_client.iter_files.return_value = iter([file('a', 10, 'x'), file('b', 10, 'x')])
+
+    report = find_duplicates(drive_client)
+
+    assert report['reclaimableBytes'] == 10
+    fields = drive_client.iter_files.call_args[0][0]
+    assert 'size' in fields and 'md5Checksum' in fields and 'ownedByMe' in fields
+    assert "'me' in owners" in drive_client.iter_files.call_args.kwargs['q']
+
+def test_trash_files_reports_failures():
+    def trash_file(file_id):
+        if file_id == 'bad':
+            raise Exception('denied')
+        return True
+    drive_client = Mock()
+    drive_client.trash_file.side_effect = trash_file
+
+    assert trash_files(drive_client, ['a', 'bad']) == {'a': True, 'bad': False}
+    drive_client.delete_file.assert_not_called()
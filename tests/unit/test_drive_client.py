@@ -1,6 +1,8 @@
 import pytest
 from unittest.mock import Mock, patch
 from src.drive.driveclient import DriveClient
+from src.utils.file_hashes import FileHashCache
+from src.utils.utils import file_md5
 
 @pytest.fixture
 def mock_auth_provider():
@@ -69,13 +71,13 @@ def test_list_files(mock_build, drive_client):
     
     # First call should be for folders
     assert files_mock.list.call_args_list[0][1] == {
-        'q': "mimeType = 'application/vnd.google-apps.folder'",
+        'q': "mimeType = 'application/vnd.google-apps.folder' and trashed = false",
         'fields': 'files(id, name)'
     }
     
     # Second call should be for non-folder files
     assert files_mock.list.call_args_list[1][1] == {
-        'q': "mimeType != 'application/vnd.google-apps.folder'",
+        'q': "mimeType != 'application/vnd.google-apps.folder' and trashed = false",
         'pageSize': 100,
         'fields': 'files(id, name, mimeType, modifiedTime, capabilities/canEdit, capabilities/canDelete, shared, ownedByMe, parents)'
     }
@@ -137,4 +139,188 @@ def test_delete_file(mock_build, drive_client):
     # Verify results
     assert result is True
     mock_build.assert_called_once_with('drive', 'v3', credentials=drive_client.auth_provider.get_credentials())
-    files_mock.delete.assert_called_once_with(fileId='1')
+    files_mock.delete.assert_called_once_with(fileId='1', supportsAllDrives=True)
+
+@patch('src.drive.driveclient.build')
+def test_walk_crawls_subtree(mock_build, drive_client):
+    """walk follows pagination per folder, descends into subfolders and yields multi parent files once"""
+    folder = 'application/vnd.google-apps.folder'
+    pages = {
+        ('root', None): {'files': [{'id': 'a', 'name': 'A', 'mimeType': folder}], 'nextPageToken': 'root2'},
+        ('root', 'root2'): {'files': [{'id': 'b', 'name': 'B', 'mimeType': folder}, {'id': 'f1', 'name': 'one.txt'}]},
+        ('a', None): {'files': [{'id': 'f2', 'name': 'two.txt'}, {'id': 'shared', 'name': 'shared.txt'}]},
+        ('b', None): {'files': [{'id': 'shared', 'name': 'shared.txt'}, {'id': 'c', 'name': 'C', 'mimeType': folder}]},
+        ('c', None): {'files': []},
+    }
+
+    def list_children(q, pageSize, pageToken, fields, **drive_args):
+        #folders inside shared drives are only listed with both flags
+        assert drive_args == {'includeItemsFromAllDrives': True, 'supportsAllDrives': True}
+        folder_id = q.split("'")[1]
+        return Mock(execute=Mock(return_value=pages[(folder_id, pageToken)]))
+    mock_build.return_value.files.return_value.list.side_effect = list_children
+
+    entries = list(drive_client.walk('root', max_workers=3))
+
+    ids = [entry['id'] for entry in entries]
+    assert sorted(ids) == ['a', 'b', 'c', 'f1', 'f2', 'shared']
+    paths = {entry['id']: entry['path'] for entry in entries}
+    assert paths['f1'] == '' and paths['f2'] == 'A' and paths['c'] == 'B'
+
+@patch('src.drive.driveclient.build')
+def test_list_shared_drive_files(mock_build, drive_client):
+    """Every shared drive is listed as its own corpus and folder names resolve within the drive"""
+    mock_service = mock_build.return_value
+    mock_service.drives.return_value.list.return_value.execute.return_value = {
+        'drives': [{'id': 'd1', 'name': 'Finance'}, {'id': 'd2', 'name': 'Legal'}]
+    }
+    pages = {
+        'd1': {'files': [
+            {'id': 'folder1', 'name': 'Reports', 'mimeType': 'application/vnd.google-apps.folder', 'parents': ['d1']},
+            {'id': '1', 'name': 'q1.pdf', 'mimeType': 'application/pdf', 'parents': ['folder1']},
+        ]},
+        'd2': {'files': [{'id': '2', 'name': 'nda.pdf', 'mimeType': 'application/pdf', 'parents': ['d2']}]},
+    }
+    mock_service.files.return_value.list.side_effect = lambda **kwargs: Mock(execute=Mock(return_value=pages[kwargs['driveId']]))
+
+    files = {file['id']: file for file in drive_client.list_shared_drive_files()}
+
+    assert set(files) == {'1', '2'}
+    assert files['1']['folderName'] == 'Reports' and files['1']['driveName'] == 'Finance'
+    assert files['2']['folderName'] == 'Legal'
+    for call in mock_service.files.return_value.list.call_args_list:
+        assert call[1]['corpora'] == 'drive'
+        assert call[1]['supportsAllDrives'] and call[1]['includeItemsFromAllDrives']
+
+def test_export_mime_type_negotiation(drive_client):
+    """Export formats resolve to mime types and are checked against the file's exportLinks"""
+    doc = {
+        'mimeType': 'application/vnd.google-apps.document',
+        'exportLinks': {'application/pdf': 'url', 'text/plain': 'url'}
+    }
+
+    assert drive_client._export_mime_type(doc) == DriveClient.GOOGLE_MIME_TYPES[doc['mimeType']]['mime_type']
+    assert drive_client._export_mime_type(doc, 'pdf') == 'application/pdf'
+    assert drive_client._export_mime_type(doc, 'text/plain') == 'text/plain'
+    assert drive_client._export_mime_type({'mimeType': 'text/plain'}) is None
+    with pytest.raises(ValueError):
+        drive_client._export_mime_type(doc, 'csv')
+    with pytest.raises(ValueError):
+        drive_client._export_mime_type(doc, 'nonsense')
+    with pytest.raises(ValueError):
+        drive_client._export_mime_type({'mimeType': 'text/plain'}, 'pdf')
+
+@patch('src.drive.driveclient.MediaIoBaseDownload')
+@patch('src.drive.driveclient.build')
+def test_iter_content_yields_chunks(mock_build, mock_downloader_class, drive_client):
+    """Content is streamed one chunk at a time with the buffer emptied between chunks"""
+    chunks = iter([b'first', b'second'])
+
+    def next_chunk():
+        buffer = mock_downloader_class.call_args[0][0]
+        buffer.write(next(chunks))
+        return None, buffer.tell() == len(b'second')
+    mock_downloader_class.return_value.next_chunk.side_effect = next_chunk
+
+    result = list(drive_client.iter_content('1', {'id': '1', 'mimeType': 'text/plain'}, chunk_size=5))
+
+    assert result == [b'first', b'second']
+    assert mock_downloader_class.call_args[1]['chunksize'] == 5
+
+@patch('src.drive.driveclient.MediaIoBaseUpload')
+@patch('src.drive.driveclient.build')
+def test_list_children_by_name_and_update(mock_build, mock_media, drive_client, tmp_path):
+    """Names are escaped in the query and updating a file drops its cached content"""
+    files = mock_build.return_value.files.return_value
+    files.list.return_value.execute.return_value = {'files': [{'id': '1', 'name': "it's"}]}
+    assert drive_client.list_children('folder', name="it's") == [{'id': '1', 'name': "it's"}]
+    assert files.list.call_args.kwargs['q'] == "'folder' in parents and trashed = false and name = 'it\\'s'"
+
+    drive_client.content_cache = Mock()
+    files.update.return_value.execute.return_value = {'id': '1'}
+    local = tmp_path / 'local.txt'
+    local.write_text('content')
+    drive_client.update_file('1', str(local))
+    assert files.update.call_args.kwargs['fileId'] == '1'
+    drive_client.content_cache.invalidate.assert_called_once_with('1')
+
+@patch('src.drive.driveclient.build')
+def test_list_changes_follows_pages(mock_build, drive_client):
+    """Changes are collected across pages until drive hands out the token to continue from"""
+    changes = mock_build.return_value.changes.return_value
+    changes.list.return_value.execute.side_effect = [
+        {'changes': [{'fileId': '1'}], 'nextPageToken': 'p2'},
+        {'changes': [{'fileId': '2', 'removed': True}], 'newStartPageToken': 't2'},
+    ]
+
+    result, token = drive_client.list_changes('t1')
+
+    assert [change['fileId'] for change in result] == ['1', '2']
+    assert token == 't2'
+    assert [call.kwargs['pageToken'] for call in changes.list.call_args_list] == ['t1', 'p2']
+
+def _upload_service(mock_build, existing, md5=None):
+    """Service mock that lists existing same named files and reads the whole upload body like the api client does"""
+    files = mock_build.return_value.files.return_value
+    files.list.return_value.execute.return_value = {'files': existing}
+
+    def send(**kwargs):
+        media = kwargs['media_body']
+        media.getbytes(0, media.size())
+        return Mock(execute=Mock(return_value={'id': kwargs.get('fileId', 'new'), 'md5Checksum': md5}))
+    files.create.side_effect = send
+    files.update.side_effect = send
+    return files
+
+@patch('src.drive.driveclient.build')
+def test_dedupe_upload_skips_identical_file(mock_build, drive_client, tmp_path):
+    local = tmp_path / 'report.pdf'
+    local.write_bytes(b'same bytes')
+    files = _upload_service(mock_build, [{'id': 'r1', 'name': 'report.pdf', 'size': '10', 'md5Checksum': file_md5(str(local))}])
+
+    result = drive_client.upload_file(str(local), 'folder', dedupe=True)
+
+    assert result['uploadAction'] == 'skipped' and result['id'] == 'r1'
+    files.create.assert_not_called()
+    files.update.assert_not_called()
+    assert "name = 'report.pdf'" in files.list.call_args.kwargs['q']
+
+@patch('src.drive.driveclient.build')
+def test_dedupe_upload_updates_changed_file_and_records_hash(mock_build, drive_client, tmp_path):
+    local = tmp_path / 'report.pdf'
+    local.write_bytes(b'new content, different size')
+    md5 = file_md5(str(local))
+    files = _upload_service(mock_build, [{'id': 'r1', 'name': 'report.pdf', 'size': '10', 'md5Checksum': 'old'}], md5)
+    drive_client.hash_cache = FileHashCache(tmp_path / 'hashes.jsonl')
+
+    with patch('src.drive.driveclient.file_md5') as read_up_front:
+        result = drive_client.upload_file(str(local), 'folder', dedupe=True)
+
+    assert result['uploadAction'] == 'updated'
+    assert files.update.call_args.kwargs['fileId'] == 'r1'
+    #the sizes differ so the file was only hashed while it streamed
+    read_up_front.assert_not_called()
+    assert drive_client.hash_cache.get(str(local)) == md5
+
+@patch('src.drive.driveclient.build')
+def test_dedupe_upload_reports_md5_mismatch(mock_build, drive_client, tmp_path):
+    local = tmp_path / 'report.pdf'
+    local.write_bytes(b'content')
+    _upload_service(mock_build, [], md5='not the local md5')
+    drive_client.hash_cache = FileHashCache(tmp_path / 'hashes.jsonl')
+
+    with pytest.raises(IOError):
+        drive_client.upload_file(str(local), 'folder', dedupe=True)
+    assert drive_client.hash_cache.get(str(local)) is None
+
+@patch('src.drive.driveclient.build')
+def test_dedupe_upload_creates_when_no_match(mock_build, drive_client, tmp_path):
+    local = tmp_path / 'report.pdf'
+    local.write_bytes(b'content')
+    #a google doc with the same name can't be updated with binary content
+    files = _upload_service(mock_build, [{'id': 'd1', 'name': 'report.pdf', 'mimeType': 'application/vnd.google-apps.document'}])
+
+    result = drive_client.upload_file(str(local), 'folder', dedupe=True)
+
+    assert result['uploadAction'] == 'created'
+    assert files.create.call_args.kwargs['body'] == {'name': 'report.pdf', 'parents': ['folder']}
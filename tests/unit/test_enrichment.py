@@ -0,0 +1,40 @@
+import itertools
+from unittest.mock import Mock
+from src.drive.driveclient import DriveClient
+from src.drive.enrichment import PageEnricher, format_timestamps
+
+
+def test_enrich_page_matches_per_file_helpers():
+    """Bulk enrichment produces the same fields as the per file helper methods for every permission combination"""
+    client = DriveClient(Mock())
+    enricher = PageEnricher(DriveClient.GOOGLE_MIME_TYPES, DriveClient.MIME_TYPE_MAPPING)
+    files = [{
+        'id': str(i),
+        'mimeType': mime_type,
+        'ownedByMe': owned,
+        'shared': shared,
+        'capabilities': {'canEdit': can_edit, 'canDelete': not can_edit},
+        'parents': parents,
+    } for i, (mime_type, owned, shared, can_edit, parents) in enumerate(itertools.product(
+        ['application/vnd.google-apps.document', 'text/plain', 'application/x-unknown'],
+        [False, True], [False, True], [False, True],
+        [['folder1'], ['missing'], []]
+    ))]
+
+    enricher.enrich_page(files, {'folder1': 'Docs'})
+
+    for file in files:
+        assert file['humanReadableType'] == client._get_human_readable_type(file['mimeType'])
+        assert file['permissionStatus'] == client._get_permission_status(file)
+        assert file['canEdit'] == file['capabilities']['canEdit']
+        assert file['canDelete'] == file['capabilities']['canDelete']
+        assert ('downloadExtension' in file) == (file['mimeType'] in DriveClient.GOOGLE_MIME_TYPES)
+    assert {file['folderName'] for file in files} == {'Docs', 'Unknown Folder', 'N/A'}
+
+def test_format_timestamps():
+    files = [{'modifiedTime': '2024-01-02T03:04:05.000Z'}, {'modifiedTime': '2024-01-02T03:04:05.000Z'}, {}]
+
+    format_timestamps(files)
+
+    assert files[0]['modifiedTime'] == files[1]['modifiedTime'] == '2024-01-02 03:04:05'
+    assert files[2] == {}
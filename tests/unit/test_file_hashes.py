@@ -0,0 +1,41 @@
+import os
+from unittest.mock import patch
+from src.utils.file_hashes import FileHashCache, HashingReader
+from src.utils.utils import file_md5
+
+
+def test_hashing_reader_ignores_resent_chunks(tmp_path):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(os.urandom(10000))
+    reader = HashingReader(str(path))
+
+    reader.read(4000)
+    assert reader.hexdigest() is None
+    #a retried chunk is read again from its start
+    reader.seek(2000)
+    reader.read(4000)
+    reader.read()
+    reader.close()
+
+    assert reader.hexdigest() == file_md5(str(path))
+
+def test_hash_cache_reuses_unchanged_files(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_text('one')
+    cache_file = tmp_path / 'hashes.jsonl'
+
+    with patch('src.utils.file_hashes.file_md5', wraps=file_md5) as hashed:
+        assert FileHashCache(cache_file).md5(str(path)) == file_md5(str(path))
+        #a new instance reads the persisted entry instead of the file
+        assert FileHashCache(cache_file).md5(str(path)) == file_md5(str(path))
+    assert hashed.call_count == 1
+
+def test_hash_cache_detects_changes(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_text('one')
+    cache = FileHashCache(tmp_path / 'hashes.jsonl')
+    cache.md5(str(path))
+
+    path.write_text('two!')
+    assert cache.get(str(path)) is None
+    assert cache.md5(str(path)) == file_md5(str(path))
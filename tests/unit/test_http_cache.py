@@ -0,0 +1,124 @@
+import pytest
+import re
+from unittest.mock import Mock, patch
+from src.utils.http_cache import listing_etag, file_validators
+
+
+@pytest.fixture
+def drive_client():
+    drive_client = Mock()
+    #no content cache so downloads go through a temp file
+    drive_client.get_cached_path.return_value = None
+    #downloads fetch metadata unless a test puts the file in a remembered listing
+    drive_client.listing_revision.return_value = None
+    return drive_client
+
+def write_download(content):
+    def download(file_id, destination_path, metadata=None, export_format=None):
+        with open(destination_path, 'wb') as f:
+            f.write(content)
+        return True
+    return download
+
+def test_listing_etag_prefers_change_token():
+    files = [{'id': '1', 'modifiedTime': '2024-01-01T00:00:00.000Z'}]
+    assert listing_etag('42', files) == 'changes-42'
+    assert listing_etag(None, files) != listing_etag(None, [])
+
+def test_file_validators():
+    etag, weak, last_modified = file_validators({'id': '1', 'md5Checksum': 'abc', 'modifiedTime': '2024-01-01T00:00:00.000Z'})
+    assert (etag, weak, last_modified.year) == ('abc', False, 2024)
+
+    etag, weak, _ = file_validators({'id': '1', 'modifiedTime': '2024-01-01T00:00:00.000Z'})
+    assert etag and weak
+
+def test_index_not_modified_skips_listing(app_client, drive_client):
+    drive_client.get_change_token.return_value = '42'
+
+    response = app_client.get('/', headers={'If-None-Match': 'W/"changes-42"'})
+
+    assert response.status_code == 304
+    drive_client.list_files.assert_not_called()
+
+def test_index_sets_weak_etag(app_client, drive_client):
+    drive_client.get_change_token.return_value = '42'
+    drive_client.list_files.return_value = []
+
+    response = app_client.get('/')
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] == 'W/"changes-42"'
+
+def test_download_not_modified_skips_download(app_client, drive_client):
+    drive_client.get_file_metadata.return_value = {'id': '1', 'md5Checksum': 'abc', 'modifiedTime': '2024-01-01T00:00:00.000Z'}
+
+    response = app_client.get('/download/1/test.txt', headers={'If-None-Match': '"abc"'})
+
+    assert response.status_code == 304
+    drive_client.download_file.assert_not_called()
+
+def test_download_range_request(app_client, drive_client):
+    metadata = {'id': '1', 'md5Checksum': 'abc', 'modifiedTime': '2024-01-01T00:00:00.000Z'}
+    drive_client.get_file_metadata.return_value = metadata
+    drive_client.download_file.side_effect = write_download(b'0123456789')
+
+    response = app_client.get('/download/1/test.txt', headers={'Range': 'bytes=2-5'})
+
+    assert response.status_code == 206
+    assert response.data == b'2345'
+    assert response.headers['ETag'] == '"abc"'
+    drive_client.download_file.assert_called_once()
+    assert drive_client.download_file.call_args.kwargs['metadata'] is metadata
+
+def test_download_served_from_content_cache(app_client, drive_client, tmp_path):
+    cached = tmp_path / 'cached'
+    cached.write_bytes(b'cached content')
+    drive_client.get_file_metadata.return_value = {'id': '1', 'md5Checksum': 'abc'}
+    drive_client.get_cached_path.return_value = str(cached)
+
+    response = app_client.get('/download/1/test.txt')
+
+    assert response.status_code == 200
+    assert response.data == b'cached content'
+    drive_client.download_file.assert_not_called()
+    assert cached.exists()
+
+@patch('src.drive.driveclient.MediaIoBaseDownload')
+@patch('src.drive.driveclient.build')
+def test_listing_download_link_is_cached_and_conditional(mock_build, mock_downloader_class, app):
+    """The index's Download link of a doc takes its revision from the listing: no metadata call, cached, then 304"""
+    doc = {'id': 'd1', 'name': 'Plan', 'mimeType': 'application/vnd.google-apps.document',
+           'modifiedTime': '2024-01-01T00:00:00.000Z', 'capabilities': {'canEdit': True, 'canDelete': True}}
+    service = mock_build.return_value
+    service.files.return_value.list.return_value.execute.return_value = {'files': [doc]}
+    service.changes.return_value.getStartPageToken.return_value.execute.return_value = {'startPageToken': '1'}
+
+    def next_chunk():
+        mock_downloader_class.call_args[0][0].write(b'docx bytes')
+        return None, True
+    mock_downloader_class.return_value.next_chunk.side_effect = next_chunk
+
+    client = app.test_client()
+    with patch.object(app.config['drive_client'].auth_provider, 'get_credentials', return_value=Mock()):
+        link = re.search(r'href="(/download/d1/[^"]+)"', client.get('/').get_data(as_text=True)).group(1)
+        first = client.get(link)
+        second = client.get(link)
+        conditional = client.get(link, headers={'If-None-Match': first.headers['ETag']})
+
+    assert first.status_code == second.status_code == 200
+    assert first.data == second.data == b'docx bytes'
+    assert conditional.status_code == 304
+    service.files.return_value.get.assert_not_called()
+    #exported once, the second download came from the content cache
+    service.files.return_value.export_media.assert_called_once()
+
+def test_export_with_fetched_metadata_gets_per_format_etag(app_client, drive_client, tmp_path):
+    drive_client.download_file.side_effect = write_download(b'%PDF')
+    drive_client.get_file_metadata.return_value = {'id': '1', 'mimeType': 'application/vnd.google-apps.document',
+                                                   'modifiedTime': '2024-01-01T00:00:00.000Z'}
+
+    response = app_client.get('/download/1/doc.pdf?format=pdf')
+    docx_response = app_client.get('/download/1/doc.docx?format=docx')
+
+    assert response.headers['ETag'].startswith('W/')
+    assert response.headers['ETag'] != docx_response.headers['ETag']
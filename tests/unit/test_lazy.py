@@ -0,0 +1,28 @@
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+from src.utils.lazy import LazyImport
+
+
+def test_lazy_import_forwards_calls_and_attributes():
+    lazy_path = LazyImport('os.path', 'join')
+    assert lazy_path('a', 'b') == __import__('os').path.join('a', 'b')
+
+    lazy_decoder = LazyImport('json', 'JSONDecoder')
+    assert lazy_decoder().decode('[1]') == [1]
+    assert lazy_decoder.resolve() is __import__('json').JSONDecoder
+
+def test_lazy_import_does_not_keep_patched_objects():
+    lazy_dumps = LazyImport('json', 'dumps')
+    with patch('json.dumps', return_value='patched'):
+        assert lazy_dumps([1]) == 'patched'
+    assert lazy_dumps([1]) == '[1]'
+
+def test_app_import_does_not_load_google_clients():
+    """Importing the app must not pull in the google client libraries, they load when the drive is first used"""
+    code = ('import sys, src.app; '
+            'print(any(m.split(".")[0] in ("googleapiclient", "google_auth_oauthlib") or m.startswith("google.oauth2") for m in sys.modules))')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=Path(__file__).resolve().parents[2])
+    assert result.stdout.strip() == 'False'
@@ -0,0 +1,53 @@
+import pytest
+from unittest.mock import Mock, patch
+from src.drive.cache import ContentCache
+from src.drive.driveclient import DriveClient
+from src.server import gunicorn_options, post_fork
+
+
+@pytest.fixture
+def preloaded():
+    """Preload the discovery document and restore the class state afterwards"""
+    DriveClient._discovery_document = None
+    DriveClient.preload()
+    yield
+    DriveClient._discovery_document = None
+
+def test_gunicorn_options(drive_config):
+    drive_config.server_bind = '127.0.0.1:9000'
+    drive_config.server_workers = 3
+    options = gunicorn_options(drive_config)
+    assert options['bind'] == '127.0.0.1:9000'
+    assert options['workers'] == 3
+    assert options['worker_class'] == 'gthread'
+    assert options['preload_app'] is True
+    assert options['graceful_timeout'] == drive_config.server_graceful_timeout
+    assert options['post_fork'] is post_fork
+
+def test_preload_builds_from_document(preloaded):
+    auth_provider = Mock()
+    client = DriveClient(auth_provider)
+    with patch('src.drive.driveclient.build') as mock_build, \
+            patch('src.drive.driveclient.build_from_document') as mock_build_from_document:
+        client._get_service()
+    mock_build.assert_not_called()
+    mock_build_from_document.assert_called_once_with(DriveClient._discovery_document, credentials=auth_provider.get_credentials.return_value)
+    assert DriveClient._discovery_document['name'] == 'drive'
+
+@patch('src.drive.driveclient.build')
+def test_post_fork_resets_connections(mock_build):
+    client = DriveClient(Mock())
+    first = client._get_service()
+    server = Mock()
+    server.app.application.config = {'drive_client': client}
+    post_fork(server, Mock())
+    mock_build.return_value = Mock()
+    assert client._get_service() is not first
+
+def test_post_fork_splits_cache_budget(tmp_path):
+    client = DriveClient(Mock(), content_cache=ContentCache(tmp_path, max_bytes=900))
+    server = Mock()
+    server.app.application.config = {'drive_client': client}
+    server.cfg.workers = 3
+    post_fork(server, Mock())
+    assert client.content_cache.max_bytes == 300
@@ -0,0 +1,72 @@
+import threading
+import time
+import pytest
+from unittest.mock import Mock, patch
+from src.drive.driveclient import DriveClient
+from src.utils.singleflight import SingleFlight
+
+
+def blocking_call(result):
+    """Function that blocks until released so concurrent callers pile up behind it"""
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return result
+    return fn, started, release, calls
+
+def test_concurrent_calls_are_coalesced():
+    single_flight = SingleFlight()
+    fn, started, release, calls = blocking_call('result')
+
+    leader = threading.Thread(target=lambda: single_flight.do('key', fn))
+    leader.start()
+    started.wait(5)
+    followers = []
+    threads = [threading.Thread(target=lambda: followers.append(single_flight.do('key', fn))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    #give the followers a moment to join the in flight call
+    while True:
+        with single_flight._lock:
+            if single_flight._calls['key'].waiters == 3:
+                break
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert followers == [('result', True)] * 3
+
+def test_results_are_not_cached():
+    single_flight = SingleFlight()
+    fn = Mock(side_effect=['first', 'second'])
+
+    assert single_flight.do('key', fn) == ('first', False)
+    assert single_flight.do('key', fn) == ('second', False)
+
+def test_errors_propagate_and_clear_key():
+    single_flight = SingleFlight()
+
+    with pytest.raises(ValueError):
+        single_flight.do('key', Mock(side_effect=ValueError('boom')))
+
+    assert single_flight.do('key', lambda: 'ok') == ('ok', False)
+
+@patch('src.drive.driveclient.build')
+def test_shared_listing_is_copied_per_caller(mock_build):
+    """Callers of a coalesced listing get their own file dicts so decorating one doesn't affect the others"""
+    drive_client = DriveClient(Mock())
+    files = [{'id': '1', 'name': 'test.txt'}]
+
+    with patch.object(SingleFlight, 'do', return_value=(files, True)):
+        result = drive_client.list_files()
+
+    assert result == files
+    assert result[0] is not files[0]
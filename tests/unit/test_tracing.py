@@ -0,0 +1,63 @@
+import json
+import pytest
+from unittest.mock import Mock, patch
+from src.drive.driveclient import DriveClient
+from src.utils.tracing import FileTracer, InMemoryTracer, NoOpTracer, create_tracer
+
+
+def test_file_tracer_writes_nested_spans(tmp_path):
+    """Spans are written as json lines with the child linked to its parent"""
+    trace_file = tmp_path / 'traces' / 'trace.jsonl'
+    tracer = FileTracer(str(trace_file))
+
+    with tracer.start_span('route.index', {'http.method': 'GET'}):
+        with tracer.start_span('drive.files.list') as span:
+            span.set_attribute('file_count', 3)
+
+    child, parent = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    assert parent['name'] == 'route.index'
+    assert parent['parent_id'] is None
+    assert child['parent_id'] == parent['span_id']
+    assert child['trace_id'] == parent['trace_id']
+    assert child['attributes'] == {'file_count': 3}
+
+def test_span_records_exception():
+    tracer = InMemoryTracer()
+
+    with pytest.raises(ValueError):
+        with tracer.start_span('drive.files.get'):
+            raise ValueError('boom')
+
+    assert tracer.spans[0].status == 'error'
+    assert tracer.spans[0].attributes['exception.type'] == 'ValueError'
+
+def test_create_tracer_defaults_to_noop(tmp_path):
+    assert isinstance(create_tracer(), NoOpTracer)
+    assert isinstance(create_tracer(str(tmp_path / 'trace.jsonl')), FileTracer)
+
+@patch('src.drive.driveclient.MediaIoBaseDownload')
+@patch('src.drive.driveclient.build')
+def test_download_records_chunk_spans(mock_build, mock_downloader_class, tmp_path):
+    """Downloading a file opens a span for the metadata call, the download and every media chunk"""
+    auth_provider = Mock()
+    tracer = InMemoryTracer()
+    drive_client = DriveClient(auth_provider, tracer=tracer)
+
+    mock_service = Mock()
+    mock_build.return_value = mock_service
+    mock_service.files.return_value.get.return_value.execute.return_value = {
+        'id': '1', 'name': 'test.txt', 'mimeType': 'text/plain', 'size': '10'
+    }
+    downloader = Mock()
+    downloader.next_chunk.side_effect = [(None, False), (None, True)]
+    mock_downloader_class.return_value = downloader
+
+    assert drive_client.download_file('1', str(tmp_path / 'test.txt'))
+
+    names = [span.name for span in tracer.spans]
+    assert names.count('drive.media.chunk') == 2
+    assert 'drive.files.get' in names
+    download_span = next(span for span in tracer.spans if span.name == 'drive.download')
+    assert download_span.attributes['chunk_count'] == 2
+    assert download_span.attributes['file.mime_type'] == 'text/plain'
+    assert download_span.attributes['file.size'] == '10'
@@ -0,0 +1,65 @@
+from unittest.mock import Mock
+from src.drive.usage import UsageAnalyzer, analyze_usage, USAGE_FIELDS, OWNED_QUERY
+
+FOLDER = 'application/vnd.google-apps.folder'
+
+#root -> Photos -> 2024, root -> Docs. Listed in no particular order, children before their folders
+LISTING = [
+    {'id': 'p1', 'name': 'beach.jpg', 'mimeType': 'image/jpeg', 'size': '500', 'parents': ['y2024']},
+    {'id': 'y2024', 'name': '2024', 'mimeType': FOLDER, 'parents': ['photos']},
+    {'id': 'p2', 'name': 'cat.jpg', 'mimeType': 'image/jpeg', 'size': '300', 'quotaBytesUsed': '600', 'parents': ['photos']},
+    {'id': 'photos', 'name': 'Photos', 'mimeType': FOLDER, 'parents': ['rootid']},
+    {'id': 'docs', 'name': 'Docs', 'mimeType': FOLDER, 'parents': ['rootid']},
+    {'id': 'd1', 'name': 'cv', 'mimeType': 'application/vnd.google-apps.document', 'parents': ['docs']},
+    {'id': 'd2', 'name': 'tax.pdf', 'mimeType': 'application/pdf', 'size': '200', 'parents': ['docs']},
+    {'id': 'r1', 'name': 'notes.txt', 'mimeType': 'text/plain', 'size': '50', 'parents': ['rootid']},
+]
+
+
+def test_folder_totals_roll_up():
+    report = UsageAnalyzer(top_n=2).add_all(LISTING).report()
+
+    assert report['totalBytes'] == 1350
+    assert report['fileCount'] == 5 and report['folderCount'] == 3
+    assert [(entry['path'], entry['bytes'], entry['fileCount']) for entry in report['children']] == [('Photos', 1100, 2), ('Docs', 200, 2)]
+    assert report['looseFiles'] == {'bytes': 50, 'fileCount': 1}
+    assert [entry['path'] for entry in report['topFolders']] == ['Photos', 'Photos/2024']
+
+def test_top_files_and_mime_types():
+    report = UsageAnalyzer(top_n=2).add_all(LISTING).report()
+
+    #quotaBytesUsed counts stored revisions so it wins over size
+    assert [(entry['path'], entry['bytes']) for entry in report['topFiles']] == [('Photos/cat.jpg', 600), ('Photos/2024/beach.jpg', 500)]
+    assert report['mimeTypes'][0] == {'mimeType': 'image/jpeg', 'bytes': 1100, 'fileCount': 2}
+    assert len(report['mimeTypes']) == 2
+
+def test_zero_top_n_keeps_totals_only():
+    report = UsageAnalyzer(top_n=0).add_all(LISTING).report()
+
+    assert report['totalBytes'] == 1350
+    assert report['topFiles'] == []
+
+def test_analyze_usage_scans_subtree_with_walk():
+    drive_client = Mock()
+    drive_client.walk.return_value = iter(LISTING[:3])
+
+    report = analyze_usage(drive_client, folder_id='photos')
+
+    drive_client.walk.assert_called_once_with('photos', fields=USAGE_FIELDS)
+    drive_client.iter_files.assert_not_called()
+    assert report['totalBytes'] == 1100
+
+def test_whole_drive_scan_counts_owned_files_only():
+    drive_client = Mock()
+    drive_client.iter_files.return_value = iter([])
+    analyze_usage(drive_client)
+    drive_client.iter_files.assert_called_once_with(USAGE_FIELDS, q=OWNED_QUERY)
+
+    drive_client.iter_files.return_value = iter([
+        {'id': 'mine', 'mimeType': 'text/plain', 'size': '10', 'ownedByMe': True},
+        {'id': 'team', 'mimeType': 'text/plain', 'size': '20', 'ownedByMe': False, 'driveId': 'd1'},
+        {'id': 'theirs', 'mimeType': 'text/plain', 'size': '40', 'ownedByMe': False},
+    ])
+    report = analyze_usage(drive_client, include_shared_drives=True)
+    assert report['totalBytes'] == 30
+    assert [entry['id'] for entry in report['topFiles']] == ['team', 'mine']
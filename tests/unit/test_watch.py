@@ -0,0 +1,108 @@
+import time
+import pytest
+from unittest.mock import Mock, patch
+from src.drive.watch import ChangeWatcher, LocalNotifier
+
+
+@pytest.fixture
+def drive_client():
+    drive_client = Mock()
+    drive_client.get_change_token.return_value = '1'
+    drive_client.list_files.return_value = [
+        {'id': 'a', 'name': 'a.txt', 'parents': ['f1'], 'folderName': 'Old'},
+        {'id': 'b', 'name': 'b.txt', 'parents': ['d1'], 'folderName': 'Reports', 'driveName': 'Finance'},
+        {'id': 'c', 'name': 'c.txt', 'parents': ['f1'], 'folderName': 'Old'},
+    ]
+    drive_client.watch_changes.return_value = {'resourceId': 'r1', 'expiration': str(int((time.time() + 3600) * 1000))}
+    drive_client.enrich_files.side_effect = lambda files: [file.setdefault('folderName', 'Unknown Folder') for file in files]
+    return drive_client
+
+@pytest.fixture
+def watcher(drive_client):
+    return ChangeWatcher(drive_client, 'https://example.com/notifications/drive', 'secret')
+
+def test_notification_applies_changes(watcher, drive_client):
+    assert [file['id'] for file in watcher.list_files()] == ['a', 'b', 'c']
+    drive_client.watch_changes.assert_called_once()
+    assert drive_client.watch_changes.call_args.args[0] == '1'
+
+    drive_client.list_changes.return_value = ([
+        {'fileId': 'b', 'file': {'id': 'b', 'name': 'b2.txt', 'parents': ['d1']}},
+        {'fileId': 'c', 'file': {'id': 'c', 'name': 'c.txt', 'parents': ['f1'], 'trashed': True}},
+        {'fileId': 'n', 'file': {'id': 'n', 'name': 'new.txt', 'parents': ['f1']}},
+        {'fileId': 'f1', 'file': {'id': 'f1', 'name': 'Renamed', 'mimeType': 'application/vnd.google-apps.folder'}},
+    ], '2')
+    watcher.notify('change')
+    watcher._executor.shutdown(wait=True)
+
+    drive_client.get_change_token.return_value = '2'
+    files = watcher.list_files()
+    assert [file['id'] for file in files] == ['n', 'a', 'b']
+    assert files[2]['name'] == 'b2.txt' and files[2]['driveName'] == 'Finance'
+    assert files[0]['folderName'] == files[1]['folderName'] == 'Renamed'
+    assert watcher.page_token == '2'
+    drive_client.list_changes.assert_called_once_with('1', False)
+    drive_client.content_cache.invalidate.assert_any_call('c')
+    drive_client.invalidate_folder_map.assert_called_once()
+
+def test_sync_notification_is_ignored(watcher, drive_client):
+    watcher.list_files()
+    watcher.notify('sync')
+    watcher.list_files()
+    drive_client.list_changes.assert_not_called()
+
+def test_missed_notification_caught_up_on_access(watcher, drive_client):
+    """Another worker got the ping: the moved change token still brings this snapshot up to date"""
+    watcher.list_files()
+    drive_client.list_changes.return_value = ([{'fileId': 'a', 'removed': True}], '2')
+    drive_client.get_change_token.return_value = '2'
+
+    assert [file['id'] for file in watcher.list_files()] == ['b', 'c']
+    assert watcher.page_token == '2'
+    drive_client.list_changes.assert_called_once_with('1', False)
+
+def test_channel_renewed_before_expiry(watcher, drive_client):
+    watcher.list_files()
+    old_channel_id = watcher._channel['id']
+    drive_client.list_changes.return_value = ([], '1')
+    #close to expiry: the next listing catches up on changes and replaces the channel
+    watcher._channel['expiration'] = time.time() + 60
+    watcher.list_files()
+
+    assert drive_client.watch_changes.call_count == 2
+    drive_client.stop_channel.assert_called_once_with(old_channel_id, 'r1')
+    assert watcher._channel['id'] != old_channel_id
+
+def test_one_channel_per_lock_file(drive_client, tmp_path):
+    """Workers sharing a lock file register a single channel, another worker takes over when the owner stops"""
+    lock_file = str(tmp_path / 'watch.lock')
+    first = ChangeWatcher(drive_client, 'https://example.com/notifications/drive', 'secret', lock_file=lock_file)
+    second = ChangeWatcher(drive_client, 'https://example.com/notifications/drive', 'secret', lock_file=lock_file)
+
+    first.list_files()
+    second.list_files()
+    assert drive_client.watch_changes.call_count == 1
+    assert second._channel is None
+
+    first.stop()
+    second.list_files()
+    assert drive_client.watch_changes.call_count == 2
+    second.stop()
+
+def test_webhook_checks_token(app, app_client, watcher):
+    app.config['change_watcher'] = watcher
+
+    with patch.object(watcher, 'notify') as notify:
+        assert app_client.post('/notifications/drive', headers={'X-Goog-Channel-Token': 'wrong'}).status_code == 403
+        response = app_client.post('/notifications/drive', headers={'X-Goog-Channel-Token': 'secret', 'X-Goog-Resource-State': 'change'})
+    assert response.status_code == 204
+    notify.assert_called_once_with('change')
+
+def test_local_notifier_posts_drive_headers():
+    with patch('urllib.request.urlopen') as urlopen:
+        urlopen.return_value.__enter__.return_value.status = 204
+        assert LocalNotifier('http://localhost:5000/notifications/drive', 'secret').post() == 204
+    request = urlopen.call_args.args[0]
+    assert request.get_method() == 'POST'
+    assert request.get_header('X-goog-channel-token') == 'secret'
+    assert request.get_header('X-goog-resource-state') == 'change'